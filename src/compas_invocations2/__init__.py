@@ -3,3 +3,10 @@ __copyright__ = "COMPAS Association"
 __license__ = "MIT License"
 __email__ = "li.chen@arch.ethz.ch"
 __version__ = "1.3.0"
+
+import os
+
+if os.environ.get("COMPAS_INVOCATIONS_TIMING") or os.environ.get("COMPAS_INVOCATIONS_TRACE"):
+    from compas_invocations2 import timing
+
+    timing.install(trace_path=os.environ.get("COMPAS_INVOCATIONS_TRACE"))
@@ -0,0 +1,208 @@
+"""Content-addressable store of build outputs, shared between checkouts and CI jobs.
+
+Outputs are stored under a key derived from the fingerprint of their inputs, so that
+building an identical source tree again (e.g. on another branch, or another CI job
+sharing the store) restores them instead of rebuilding them.
+
+The store is enabled by setting ``artifact_store.path`` in the invoke configuration or
+the ``COMPAS_INVOCATIONS_ARTIFACT_STORE`` environment variable to a local or shared
+folder. Its size is bounded by ``artifact_store.max_size`` (bytes, or a string like
+``"5G"``; defaults to ``DEFAULT_MAX_SIZE``) and the least recently used entries are
+evicted first. Entries are written to a temporary folder and renamed into place, so
+concurrent jobs never see partial entries.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from compas_invocations2.cache import atomic_write
+from compas_invocations2.cache import default_mode
+from compas_invocations2.cache import read_json
+
+DEFAULT_MAX_SIZE = 10 * 1024**3
+
+# metadata of an entry, its modification time is the last time the entry was used
+META = "meta.json"
+
+_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def store_path(ctx):
+    """Return the root folder of the artifact store, or None if it is not configured."""
+    path = (ctx.get("artifact_store") or {}).get("path") or os.environ.get("COMPAS_INVOCATIONS_ARTIFACT_STORE")
+    return os.path.abspath(os.path.expanduser(path)) if path else None
+
+
+def _max_size(ctx):
+    value = (ctx.get("artifact_store") or {}).get("max_size") or DEFAULT_MAX_SIZE
+    if isinstance(value, str):
+        match = re.match(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", value, re.IGNORECASE)
+        if not match:
+            raise ValueError("Invalid artifact store size: {}".format(value))
+        value = float(match.group(1)) * _UNITS[match.group(2).upper()]
+    return int(value)
+
+
+def _entry_path(root, key):
+    return os.path.join(root, "objects", key[:2], key)
+
+
+def restore(ctx, key, replace=()):
+    """Copy the files of an entry of the store back to ``base_folder``.
+
+    Parameters
+    ----------
+    ctx : :class:`invoke.Context`
+        The invoke context.
+    key : str
+        The key of the entry, e.g. the fingerprint of the inputs of the outputs.
+    replace : list of str, optional
+        Paths of the current outputs, removed before the entry is restored so that
+        no stale output of another build is left behind. Nothing is removed if the
+        entry does not exist.
+
+    Returns
+    -------
+    list of str or None
+        The restored paths, relative to ``base_folder``, or None if the entry does not exist.
+    """
+    root = store_path(ctx)
+    if not root:
+        return None
+
+    entry = _entry_path(root, key)
+    meta = read_json(os.path.join(entry, META))
+    if not meta:
+        return None
+
+    _touch(os.path.join(entry, META))
+    try:
+        for path in replace:
+            if os.path.isfile(path):
+                os.remove(path)
+        for path in meta["files"]:
+            target = os.path.join(ctx.base_folder, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # a copy rather than a link, so that modifying the outputs never corrupts the store
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+            os.close(fd)
+            shutil.copy2(os.path.join(entry, "files", path), tmp_path)
+            os.replace(tmp_path, target)
+    except OSError:
+        # evicted by a concurrent job in the meantime
+        return None
+    return meta["files"]
+
+
+def _touch(meta):
+    """Mark an entry as recently used."""
+    try:
+        os.utime(meta)
+    except OSError:
+        # e.g. published by another user, the entry is still usable
+        pass
+
+
+def publish(ctx, key, paths):
+    """Add files to the store under ``key``, unless an entry with this key already exists.
+
+    Paths outside of ``base_folder`` are ignored. The least recently used entries are
+    evicted afterwards if the store exceeds its maximum size.
+
+    Parameters
+    ----------
+    ctx : :class:`invoke.Context`
+        The invoke context.
+    key : str
+        The key of the entry, e.g. the fingerprint of the inputs of the outputs.
+    paths : list of str
+        Paths of the files to store.
+
+    Returns
+    -------
+    bool
+        True if a new entry was added, otherwise False.
+    """
+    root = store_path(ctx)
+    if not root:
+        return False
+
+    entry = _entry_path(root, key)
+    if os.path.exists(os.path.join(entry, META)):
+        _touch(os.path.join(entry, META))
+        return False
+
+    base_folder = os.path.abspath(ctx.base_folder)
+    files = []
+    for path in paths:
+        relative = os.path.relpath(os.path.abspath(path), base_folder)
+        if not relative.startswith(".."):
+            files.append(relative.replace(os.sep, "/"))
+    if not files:
+        return False
+
+    tmp_root = os.path.join(root, "tmp")
+    os.makedirs(tmp_root, exist_ok=True)
+    os.makedirs(os.path.dirname(entry), exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=tmp_root)
+    try:
+        size = 0
+        for path in sorted(files):
+            target = os.path.join(tmp, "files", path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(os.path.join(base_folder, path), target)
+            size += os.path.getsize(target)
+        atomic_write(os.path.join(tmp, META), json.dumps({"files": sorted(files), "size": size}))
+        # mkdtemp creates a private folder, entries must be readable by the other users of a shared store
+        os.chmod(tmp, default_mode(folder=True))
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # published by a concurrent job in the meantime
+            return False
+    finally:
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    evict(root, _max_size(ctx))
+    return True
+
+
+def evict(root, max_size):
+    """Remove the least recently used entries until the store is not larger than ``max_size`` bytes.
+
+    Returns
+    -------
+    int
+        The number of removed entries.
+    """
+    entries = []
+    objects = os.path.join(root, "objects")
+    for prefix in os.listdir(objects) if os.path.isdir(objects) else []:
+        for key in os.listdir(os.path.join(objects, prefix)):
+            entry = os.path.join(objects, prefix, key)
+            try:
+                used = os.path.getmtime(os.path.join(entry, META))
+            except OSError:
+                continue
+            entries.append((used, (read_json(os.path.join(entry, META)) or {}).get("size", 0), entry))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, entry in sorted(entries):
+        if total <= max_size:
+            break
+        # moved out of the objects first, so that no job restores a partially deleted entry
+        trash = os.path.join(root, "tmp", "evicted-{}-{}".format(os.path.basename(entry), time.time()))
+        try:
+            os.rename(entry, trash)
+        except OSError:
+            continue
+        shutil.rmtree(trash, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
@@ -1,15 +1,129 @@
-import glob
+import concurrent.futures
+import fnmatch
+import hashlib
 import os
 import platform
 import shutil
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 
 import invoke
 
+from compas_invocations2 import style
+from compas_invocations2 import tests
+from compas_invocations2.cache import cache_key
+from compas_invocations2.cache import file_digest
+from compas_invocations2.cache import get_cache_dir
+from compas_invocations2.cache import read_json
+from compas_invocations2.cache import write_json
 from compas_invocations2.console import chdir
 from compas_invocations2.console import confirm
+from compas_invocations2.fingerprint import fingerprinted
+from compas_invocations2.project import load_project
+
+# Directory names (or paths relative to ``base_folder``) that ``clean`` never descends into.
+# Can be overridden with the ``clean.exclude`` setting.
+CLEAN_EXCLUDE = [".git", ".hg", ".svn", ".venv", "venv", ".tox", ".nox", "node_modules"]
+
+
+def _scan_artifacts(base_folder, targets, exclude, bytecode=True, builds=True):
+    """Find all cleanable artifacts under ``base_folder`` in a single traversal.
+
+    Parameters
+    ----------
+    base_folder : str
+        Root folder of the traversal.
+    targets : dict
+        Mapping of absolute folder paths to their category. These folders are
+        collected as a whole and never descended into.
+    exclude : list of str
+        Directory names or ``base_folder``-relative paths (glob patterns allowed) to prune.
+    bytecode : bool
+        True to collect ``__pycache__`` folders and ``.pyc`` files.
+    builds : bool
+        True to collect ``*.egg-info`` folders.
+
+    Returns
+    -------
+    list of tuple
+        ``(category, path, is_dir)`` tuples.
+    """
+    artifacts = []
+    for path, category in targets.items():
+        if os.path.isdir(path) and not path.startswith(os.path.join(base_folder, "")):
+            artifacts.append((category, path, True))
+
+    stack = [base_folder]
+    while stack:
+        folder = stack.pop()
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            continue
+
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.path in targets:
+                    artifacts.append((targets[entry.path], entry.path, True))
+                    continue
+                relpath = os.path.relpath(entry.path, base_folder).replace(os.sep, "/")
+                if any(fnmatch.fnmatch(entry.name, p) or fnmatch.fnmatch(relpath, p) for p in exclude):
+                    continue
+                if bytecode and entry.name == "__pycache__":
+                    artifacts.append(("bytecode", entry.path, True))
+                elif builds and entry.name.endswith(".egg-info"):
+                    artifacts.append(("builds", entry.path, True))
+                else:
+                    stack.append(entry.path)
+            elif bytecode and entry.name.endswith(".pyc"):
+                artifacts.append(("bytecode", entry.path, False))
+
+    return artifacts
+
+
+def _measure(path, is_dir):
+    """Return the number of files and bytes held by an artifact."""
+    if not is_dir:
+        try:
+            return 1, os.stat(path, follow_symlinks=False).st_size
+        except OSError:
+            return 0, 0
+
+    files, size = 0, 0
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            else:
+                files += 1
+                size += entry.stat(follow_symlinks=False).st_size
+    return files, size
+
+
+def _remove(path, is_dir):
+    if is_dir:
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return "{:.1f} {}".format(size, unit)
+        size /= 1024.0
+    return "{:.1f} GB".format(size)
 
 
 @invoke.task(
@@ -17,67 +131,175 @@ from compas_invocations2.console import confirm
         "docs": "True to clean up generated documentation, otherwise False",
         "bytecode": "True to clean up compiled python files, otherwise False.",
         "builds": "True to clean up build/packaging artifacts, otherwise False.",
+        "ghuser": "True to clean up built Grasshopper components, otherwise False.",
+        "dry": "True to only report what would be deleted (file counts and sizes per category), otherwise False.",
     }
 )
-def clean(ctx, docs=True, bytecode=True, builds=True, ghuser=True):
-    """Cleans the local copy from compiled artifacts."""
-
-    with chdir(ctx.base_folder):
-        if bytecode:
-            for root, dirs, files in os.walk(ctx.base_folder):
-                for f in files:
-                    if f.endswith(".pyc"):
-                        os.remove(os.path.join(root, f))
-                if ".git" in dirs:
-                    dirs.remove(".git")
-
-        folders = []
-
-        if docs:
-            folders.append("docs/api/generated")
-
-        folders.append("dist/")
+def clean(ctx, docs=True, bytecode=True, builds=True, ghuser=True, dry=False):
+    """Cleans the local copy from compiled artifacts.
 
-        if bytecode:
-            for t in ("src", "tests"):
-                folders.extend(glob.glob("{}/**/__pycache__".format(t), recursive=True))
+    The project is traversed once, skipping the folders listed in the ``clean.exclude``
+    setting (defaults to ``CLEAN_EXCLUDE``), and all artifacts are deleted on a thread pool.
 
-        if builds:
-            folders.append("build/")
-            folders.extend(glob.glob("src/**/*.egg-info", recursive=False))
+    """
+    base_folder = os.path.abspath(ctx.base_folder)
+    exclude = (ctx.get("clean") or {}).get("exclude", CLEAN_EXCLUDE)
+
+    targets = {os.path.join(base_folder, "dist"): "builds"}
+    if docs:
+        targets[os.path.join(base_folder, "docs", "api", "generated")] = "docs"
+    if builds:
+        targets[os.path.join(base_folder, "build")] = "builds"
+    if ghuser and ctx.get("ghuser"):
+        targets[os.path.abspath(os.path.join(base_folder, ctx.ghuser.target_dir))] = "ghuser"
+
+    artifacts = _scan_artifacts(base_folder, targets, exclude, bytecode=bytecode, builds=builds)
+
+    if dry:
+        report = {}
+        for category, path, is_dir in artifacts:
+            files, size = _measure(path, is_dir)
+            totals = report.setdefault(category, [0, 0])
+            totals[0] += files
+            totals[1] += size
+
+        print("{:<10} {:>8} {:>12}".format("Category", "Files", "Size"))
+        for category in sorted(report):
+            files, size = report[category]
+            print("{:<10} {:>8} {:>12}".format(category, files, _format_size(size)))
+        files = sum(f for f, _ in report.values())
+        size = sum(s for _, s in report.values())
+        print("{:<10} {:>8} {:>12}".format("Total", files, _format_size(size)))
+        return
+
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        list(executor.map(lambda artifact: _remove(*artifact[1:]), artifacts))
+
+
+# Inputs of the sdist and wheel built by `release`, relative to `base_folder`.
+DIST_INPUTS = [
+    "pyproject.toml",
+    "setup.py",
+    "setup.cfg",
+    "MANIFEST.in",
+    "README.md",
+    "LICENSE",
+    "requirements*.txt",
+    "src/**/*",
+]
+
+
+def _plan_stages(steps):
+    """Group a graph of steps into stages whose steps only depend on earlier stages."""
+    stages = []
+    planned = set()
+    while len(planned) < len(steps):
+        stage = [name for name, (deps, _) in steps.items() if name not in planned and set(deps) <= planned]
+        if not stage:
+            raise ValueError("The steps contain a dependency cycle: {}".format(", ".join(set(steps) - planned)))
+        stages.append(stage)
+        planned.update(stage)
+    return stages
+
+
+def _run_steps(steps):
+    """Run a graph of steps, each one as soon as all its dependencies have completed.
+
+    Independent steps run concurrently. After the first failure no new steps are
+    started, the running ones are awaited and :class:`invoke.Exit` is raised.
+
+    Parameters
+    ----------
+    steps : dict
+        Mapping of step names to ``(dependencies, callable)`` tuples.
+    """
+    _plan_stages(steps)
+
+    done = set()
+    running = {}
+    failure = None
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        while True:
+            if failure is None:
+                for name, (deps, func) in steps.items():
+                    if name not in done and name not in running.values() and set(deps) <= done:
+                        running[executor.submit(func)] = name
+
+            if not running:
+                break
+
+            finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    future.result()
+                except BaseException as e:
+                    failure = failure or (name, e)
+                else:
+                    done.add(name)
+
+    if failure:
+        raise invoke.Exit("Release step `{}` failed: {}".format(*failure))
+
+
+def _dist_outputs(ctx):
+    version = load_project(ctx.base_folder).version
+    return ["dist/*-{}-*.whl".format(version), "dist/*-{}.tar.gz".format(version)]
+
+
+@fingerprinted(inputs=DIST_INPUTS, outputs=[_dist_outputs], name="build.dists", store=True)
+def _build_dists(ctx):
+    ctx.run("python -m build")
 
-        if ghuser and ctx.get("ghuser"):
-            folders.append(os.path.abspath(ctx.ghuser.target_dir))
 
-        for folder in folders:
-            shutil.rmtree(os.path.join(ctx.base_folder, folder), ignore_errors=True)
+def _check_changelog(ctx):
+    with open(os.path.join(ctx.base_folder, "CHANGELOG.md"), "r") as changelog:
+        if "\n## Unreleased\n" not in changelog.read():
+            raise invoke.Exit("Changelog does not contain an unreleased section to release.")
 
 
 @invoke.task(
-    help={"release_type": "Type of release follows semver rules. Must be one of: major, minor, patch, pre_l, pre_n."}
+    help={
+        "release_type": "Type of release follows semver rules. Must be one of: major, minor, patch, pre_l, pre_n.",
+        "plan": "True to only print the release steps and their dependencies, otherwise False.",
+    }
 )
-def release(ctx, release_type):
-    """Releases the project in one swift command!"""
-    if release_type not in ("patch", "minor", "major", "pre_l", "pre_n"):
-        raise invoke.Exit("The release type parameter is invalid.\nMust be one of: major, minor, patch.")
-
-    # Run formatter
-    ctx.run("invoke format")
+def release(ctx, release_type, plan=False):
+    """Releases the project in one swift command!
 
-    # Run checks
-    ctx.run("invoke test")
+    The release is a graph of steps that run in-process, each one as soon as the steps it
+    depends on are done, so that independent steps (e.g. formatting and checking the
+    changelog) run concurrently. The first failing step stops the release.
 
-    # Bump version and git tag it
-    ctx.run("bump-my-version bump %s --verbose" % release_type)
+    """
+    if release_type not in ("patch", "minor", "major", "pre_l", "pre_n"):
+        raise invoke.Exit("The release type parameter is invalid.\nMust be one of: major, minor, patch.")
 
-    # Build project
-    ctx.run("python -m build")
+    steps = {
+        "format": ([], lambda: style.format(ctx)),
+        "check-changelog": ([], lambda: _check_changelog(ctx)),
+        "test": (["format"], lambda: tests.test(ctx)),
+        # Bump version and git tag it
+        "bump": (["test", "check-changelog"], lambda: ctx.run("bump-my-version bump %s --verbose" % release_type)),
+        # sdist and wheel are built by a single `build` call: building them concurrently
+        # would have both setuptools runs write the same in-tree egg-info folder
+        "build": (["bump"], lambda: _build_dists(ctx)),
+        # Prepare the change log for the next release
+        "prepare-changelog": (["build"], lambda: prepare_changelog(ctx)),
+        # Clean up local artifacts
+        "clean": (["prepare-changelog"], lambda: clean(ctx)),
+    }
 
-    # Prepare the change log for the next release
-    prepare_changelog(ctx)
+    if plan:
+        project = load_project(ctx.base_folder)
+        print("Release plan for {} {} ({} release):".format(project.name, project.version, release_type))
+        for i, stage in enumerate(_plan_stages(steps), 1):
+            for name in stage:
+                deps = steps[name][0]
+                print("  {}. {:<20} {}".format(i, name, "after: " + ", ".join(deps) if deps else "").rstrip())
+        return
 
-    # Clean up local artifacts
-    clean(ctx)
+    _run_steps(steps)
 
     # Upload to pypi
     if confirm(
@@ -106,89 +328,388 @@ def prepare_changelog(ctx):
         ctx.run('git add CHANGELOG.md && git commit -m "Prepare changelog for next release"')
 
 
+COMPONENTIZER_URL = "https://github.com/compas-dev/compas-actions.ghpython_components.git"
+
+# Serializes cache updates when components are built by several shards at once.
+_CACHE_LOCK = threading.Lock()
+
+# Checkouts already brought up to date in this process, keyed by (repo_url, ref).
+_COMPONENTIZER_CHECKOUTS = {}
+
+
+def _get_componentizer(ctx):
+    """Return the folder of a cached checkout of the GH componentizer.
+
+    The checkout lives in the user-level cache, keyed by repository URL and ref, and is
+    shared by all component build tasks. It is updated with a shallow fetch of the ref
+    configured in ``componentizer.ref`` (defaults to the remote ``HEAD``); when the fetch
+    fails, e.g. because we are offline, the cached copy is used as-is. A ref that is a
+    full commit hash is never re-fetched once checked out.
+
+    The repository can be overridden with ``componentizer.repo_url``, which may also
+    point to a local (bare) repository.
+    """
+    with _CACHE_LOCK:
+        settings = ctx.get("componentizer") or {}
+        repo_url = settings.get("repo_url") or COMPONENTIZER_URL
+        ref = settings.get("ref") or "HEAD"
+
+        key = (repo_url, ref)
+        if key in _COMPONENTIZER_CHECKOUTS:
+            return _COMPONENTIZER_CHECKOUTS[key]
+
+        checkout_dir = get_cache_dir("componentizer", cache_key(repo_url, ref), ctx=ctx)
+        git = 'git -C "{}"'.format(checkout_dir)
+
+        # only ask git once the checkout exists, otherwise it would pick up any repository above the cache
+        head = None
+        if os.path.isdir(os.path.join(checkout_dir, ".git")):
+            head = ctx.run("{} rev-parse --verify -q HEAD".format(git), warn=True, hide=True)
+        is_cached = head is not None and head.ok
+        if head is None:
+            ctx.run('git init -q "{}"'.format(checkout_dir), hide=True)
+
+        if is_cached and head.stdout.strip() == ref:
+            print("Using pinned componentizer at {}".format(ref))
+        else:
+            fetch = ctx.run('{} fetch -q --depth 1 "{}" {}'.format(git, repo_url, ref), warn=True, hide=True)
+            if fetch.ok:
+                ctx.run("{} checkout -q --force --detach FETCH_HEAD".format(git), hide=True)
+            elif is_cached:
+                print("Could not update the componentizer from {}, using the cached copy.".format(repo_url))
+            else:
+                raise invoke.Exit("Failed to fetch the componentizer from {}:\n{}".format(repo_url, fetch.stderr))
+
+        _COMPONENTIZER_CHECKOUTS[key] = checkout_dir
+        return checkout_dir
+
+
+def _fetch_ghio_lib(target_folder):
+    import compas_ghpython
+
+    compas_ghpython.fetch_ghio_lib(target_folder)
+
+
+def _verified_ghio_folder(root, digest):
+    """Return the cache folder of a GH_IO.dll if its content still matches ``digest``."""
+    folder = os.path.join(root, digest)
+    dll = os.path.join(folder, "GH_IO.dll")
+    if os.path.isfile(dll) and file_digest(dll) == digest:
+        return folder
+    return None
+
+
+def _download_ghio(root):
+    """Download GH_IO.dll into the content-addressed cache and return its digest."""
+    download_dir = tempfile.mkdtemp(prefix=".download-", dir=root)
+    try:
+        _fetch_ghio_lib(download_dir)
+        digest = file_digest(os.path.join(download_dir, "GH_IO.dll"))
+        if not _verified_ghio_folder(root, digest):
+            shutil.rmtree(os.path.join(root, digest), ignore_errors=True)
+            os.rename(download_dir, os.path.join(root, digest))
+        return digest
+    finally:
+        shutil.rmtree(download_dir, ignore_errors=True)
+
+
+def _get_ghio_folder(ctx):
+    """Return a folder containing GH_IO.dll, served from a content-addressed cache.
+
+    Every downloaded GH_IO.dll is stored under its SHA-256 and verified against it
+    before being reused. The most recent download is reused for ``ghio.max_age`` days
+    (defaults to 30), or forever if ``ghio.sha256`` pins the expected checksum, so
+    repeated builds do no network I/O. Only the ``ghio.keep`` (defaults to 3) most
+    recently used versions are kept.
+    """
+    with _CACHE_LOCK:
+        settings = ctx.get("ghio") or {}
+        pinned = settings.get("sha256")
+        max_age = settings.get("max_age", 30) * 24 * 3600
+        keep = max(settings.get("keep", 3), 1)
+
+        root = get_cache_dir("ghio", ctx=ctx)
+        index_path = os.path.join(root, "index.json")
+        index = read_json(index_path, {})
+        entries = index.setdefault("entries", {})
+        latest = index.get("latest") or {}
+        now = time.time()
+
+        digest = pinned or latest.get("sha256")
+        folder = _verified_ghio_folder(root, digest) if digest else None
+        fresh = pinned or now - latest.get("fetched", 0) < max_age
+
+        if folder is None or not fresh:
+            try:
+                digest = _download_ghio(root)
+            except Exception as e:
+                if folder is None:
+                    raise invoke.Exit("Failed to download GH_IO.dll: {}".format(e))
+                print("Could not refresh GH_IO.dll ({}), using the cached copy.".format(e))
+            else:
+                if pinned and digest != pinned:
+                    raise invoke.Exit("Checksum mismatch for GH_IO.dll: expected {}, got {}.".format(pinned, digest))
+                folder = os.path.join(root, digest)
+                if not pinned:
+                    index["latest"] = {"sha256": digest, "fetched": now}
+
+        entries[digest] = {"last_used": now}
+        for stale in sorted(entries, key=lambda d: entries[d]["last_used"], reverse=True)[keep:]:
+            shutil.rmtree(os.path.join(root, stale), ignore_errors=True)
+            del entries[stale]
+
+        write_json(index_path, index)
+        return folder
+
+
+# Name of the manifest kept in the target folder of the ghuser build tasks.
+GHUSER_MANIFEST = ".ghuser-manifest.json"
+
+
+def _component_digest(folder):
+    """Return a digest of all the source files (code, metadata, icon, ...) of a component folder."""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        for name in sorted(files):
+            if name.endswith(".pyc"):
+                continue
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, folder).replace(os.sep, "/").encode("utf-8"))
+            digest.update(file_digest(path).encode("ascii"))
+    return digest.hexdigest()
+
+
+def _assign_outputs(outputs, names):
+    """Map the files written by the componentizer back to the components they were built from.
+
+    Output files are named after the component folder, optionally preceded by the prefix,
+    so the longest component name that ends the file stem wins.
+    """
+    assigned = {name: [] for name in names}
+    for output in outputs:
+        stem = os.path.splitext(output)[0]
+        matches = [name for name in names if stem.endswith(name)]
+        if matches:
+            assigned[max(matches, key=len)].append(output)
+        elif len(names) == 1:
+            assigned[names[0]].append(output)
+    return assigned
+
+
+def _stage_components(source_dir, names, staging_dir):
+    """Expose a subset of the component folders of ``source_dir`` in ``staging_dir``."""
+    os.makedirs(staging_dir)
+    for name in names:
+        src = os.path.join(source_dir, name)
+        dst = os.path.join(staging_dir, name)
+        try:
+            os.symlink(src, dst, target_is_directory=True)
+        except OSError:
+            shutil.copytree(src, dst)
+
+
+def _run_shard(componentize, source_dir, names, staging_dir):
+    """Componentize one shard of components in its own staging folders.
+
+    When the componentizer fails, the components of the shard that were not built are
+    retried one by one, so that a single broken component is isolated from the others.
+
+    Returns the output files and the error (if any) per component.
+    """
+    staging_source = os.path.join(staging_dir, "source")
+    staging_target = os.path.join(staging_dir, "target")
+    _stage_components(source_dir, names, staging_source)
+    os.makedirs(staging_target)
+
+    error = None
+    try:
+        componentize(staging_source, staging_target)
+    except Exception as e:
+        error = e
+
+    results = {}
+    for name, outputs in _assign_outputs(sorted(os.listdir(staging_target)), names).items():
+        outputs = [os.path.join(staging_target, output) for output in outputs]
+        if outputs or error is None or len(names) == 1:
+            results[name] = (outputs, error if not outputs else None)
+        else:
+            results.update(_run_shard(componentize, source_dir, [name], os.path.join(staging_dir, name)))
+    return results
+
+
+def _ghuser_paths(section, folder, *patterns):
+    """Return a callable listing the given patterns inside a folder of a ghuser config section."""
+
+    def paths(ctx, **kwargs):
+        root = os.path.abspath(ctx[section][folder])
+        return [os.path.join(root, pattern) for pattern in patterns]
+
+    return paths
+
+
+def _build_components(source_dir, target_dir, componentize, settings, force=False, jobs=1):
+    """Incrementally build the components of ``source_dir`` into ``target_dir``.
+
+    Every component folder is hashed and the hashes are stored, together with the files
+    built from them, in a manifest in ``target_dir``. Only new or changed components are
+    passed to ``componentize(source, target)``, and the outputs of deleted components are
+    removed. Changing ``settings`` or setting ``force`` rebuilds everything.
+
+    The components to build are split in up to ``jobs`` shards which are componentized
+    concurrently, each one in its own process. A failing component does not stop the
+    other shards; all failures are reported at the end.
+    """
+    manifest_path = os.path.join(target_dir, GHUSER_MANIFEST)
+    manifest = read_json(manifest_path, {})
+    if force or manifest.get("settings") != settings:
+        shutil.rmtree(target_dir, ignore_errors=True)
+        manifest = {}
+    os.makedirs(target_dir, exist_ok=True)
+
+    built = manifest.get("components", {})
+    components = {}
+    for entry in sorted(os.scandir(source_dir), key=lambda e: e.name):
+        if entry.is_dir() and not entry.name.startswith((".", "__")):
+            components[entry.name] = _component_digest(entry.path)
+
+    for name in sorted(set(built) - set(components)):
+        for output in built.pop(name)["outputs"]:
+            try:
+                os.remove(os.path.join(target_dir, output))
+            except FileNotFoundError:
+                pass
+        print("Removed: {}".format(name))
+
+    changed = []
+    for name, digest in components.items():
+        previous = built.get(name)
+        if (
+            previous is None
+            or previous["digest"] != digest
+            or not all(os.path.exists(os.path.join(target_dir, o)) for o in previous["outputs"])
+        ):
+            changed.append(name)
+
+    failures = {}
+    if not changed:
+        print("All {} components are up to date.".format(len(components)))
+    else:
+        count = max(min(jobs, len(changed)), 1)
+        shards = [changed[i::count] for i in range(count)]
+        print("Building {} of {} components in {} shard(s)...".format(len(changed), len(components), len(shards)))
+
+        with tempfile.TemporaryDirectory(prefix="ghuser-") as staging_dir:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(shards)) as executor:
+                futures = [
+                    executor.submit(_run_shard, componentize, source_dir, names, os.path.join(staging_dir, str(i)))
+                    for i, names in enumerate(shards)
+                ]
+
+            for future in futures:
+                for name, (outputs, error) in future.result().items():
+                    if not outputs:
+                        failures[name] = error or "no output was produced"
+                        continue
+                    for output in outputs:
+                        shutil.move(output, os.path.join(target_dir, os.path.basename(output)))
+                    built[name] = {"digest": components[name], "outputs": [os.path.basename(o) for o in outputs]}
+
+    write_json(manifest_path, {"settings": settings, "components": built})
+
+    if failures:
+        for name in sorted(failures):
+            print("❌ Failed to build {}: {}".format(name, failures[name]))
+        raise invoke.Exit("Failed to build {} of {} components.".format(len(failures), len(changed)))
+
+
 @invoke.task(
     help={
         "gh_io_folder": "Folder where GH_IO.dll is located. If not specified, it will try to download from NuGet.",
         "ironpython": "Command for running the IronPython executable. Defaults to `ipy`.",
         "prefix": "(Optional) Append this prefix to the names of the built components.",
+        "force": "True to rebuild all components, otherwise only new and changed ones are rebuilt.",
+        "jobs": "(Optional) Number of componentizer processes to run in parallel. Defaults to the number of CPUs.",
     }
 )
-def build_ghuser_components(ctx, gh_io_folder=None, ironpython=None, prefix=None):
+@fingerprinted(
+    inputs=[_ghuser_paths("ghuser", "source_dir", "**/*")],
+    outputs=[_ghuser_paths("ghuser", "target_dir", "*.ghuser", GHUSER_MANIFEST)],
+    config=["ghuser.prefix", "componentizer", "ironpython"],
+    args=["gh_io_folder", "ironpython", "prefix"],
+    store=True,
+)
+def build_ghuser_components(ctx, gh_io_folder=None, ironpython=None, prefix=None, force=False, jobs=None):
     """Builds Grasshopper components using GH Componentizer."""
     prefix = prefix or getattr(ctx.ghuser, "prefix", None)
+    jobs = int(jobs or getattr(ctx.ghuser, "jobs", None) or os.cpu_count() or 1)
     source_dir = os.path.abspath(ctx.ghuser.source_dir)
     target_dir = os.path.abspath(ctx.ghuser.target_dir)
-    repo_url = "https://github.com/compas-dev/compas-actions.ghpython_components.git"
 
-    with chdir(ctx.base_folder):
-        shutil.rmtree(os.path.join(ctx.base_folder, target_dir), ignore_errors=True)
+    if not ironpython:
+        ironpython = ctx.get("ironpython") or "ipy"
 
-    # Build IronPython Grasshopper user objects from source
-    with chdir(ctx.base_folder):
-        with tempfile.TemporaryDirectory("actions.ghcomponentizer") as action_dir:
-            ctx.run("git clone {} {}".format(repo_url, action_dir))
-
-            if not gh_io_folder:
-                gh_io_folder = tempfile.mkdtemp("ghio")
-                import compas_ghpython
-
-                compas_ghpython.fetch_ghio_lib(gh_io_folder)
+    def componentize(source, target):
+        action_dir = _get_componentizer(ctx)
+        componentizer_script = os.path.join(action_dir, "componentize_ipy.py")
+        ghio = os.path.abspath(gh_io_folder or _get_ghio_folder(ctx))
 
-            if not ironpython:
-                ironpython = ctx.get("ironpython") or "ipy"
+        cmd = "{} {} {} {}".format(ironpython, componentizer_script, source, target)
+        cmd += ' --ghio "{}"'.format(ghio)
+        if prefix:
+            cmd += ' --prefix "{}"'.format(prefix)
 
-            gh_io_folder = os.path.abspath(gh_io_folder)
-            componentizer_script = os.path.join(action_dir, "componentize_ipy.py")
+        ctx.run(cmd)
 
-            cmd = "{} {} {} {}".format(ironpython, componentizer_script, source_dir, target_dir)
-            cmd += ' --ghio "{}"'.format(gh_io_folder)
-            if prefix:
-                cmd += ' --prefix "{}"'.format(prefix)
-
-            ctx.run(cmd)
+    # Build IronPython Grasshopper user objects from source
+    with chdir(ctx.base_folder):
+        settings = ["ironpython", ironpython, prefix, dict(ctx.get("componentizer") or {})]
+        _build_components(source_dir, target_dir, componentize, settings, force=force, jobs=jobs)
 
 
 @invoke.task(
     help={
         "gh_io_folder": "Folder where GH_IO.dll is located. If not specified, it will try to download from NuGet.",
         "prefix": "(Optional) Append this prefix to the names of the built components.",
+        "force": "True to rebuild all components, otherwise only new and changed ones are rebuilt.",
+        "jobs": "(Optional) Number of componentizer processes to run in parallel. Defaults to the number of CPUs.",
     }
 )
-def build_cpython_ghuser_components(ctx, gh_io_folder=None, prefix=None):
+@fingerprinted(
+    inputs=[_ghuser_paths("ghuser_cpython", "source_dir", "**/*")],
+    outputs=[_ghuser_paths("ghuser_cpython", "target_dir", "*.ghuser", GHUSER_MANIFEST)],
+    config=["ghuser_cpython.prefix", "componentizer"],
+    args=["gh_io_folder", "prefix"],
+    store=True,
+)
+def build_cpython_ghuser_components(ctx, gh_io_folder=None, prefix=None, force=False, jobs=None):
     """Builds CPython Grasshopper components using GH Componentizer."""
     prefix = prefix or getattr(ctx.ghuser_cpython, "prefix", None)
+    jobs = int(jobs or getattr(ctx.ghuser_cpython, "jobs", None) or os.cpu_count() or 1)
     source_dir = os.path.abspath(ctx.ghuser_cpython.source_dir)
     target_dir = os.path.abspath(ctx.ghuser_cpython.target_dir)
-    repo_url = "https://github.com/compas-dev/compas-actions.ghpython_components.git"
 
-    with chdir(ctx.base_folder):
-        shutil.rmtree(os.path.join(ctx.base_folder, target_dir), ignore_errors=True)
-
-    # Build CPython Grasshopper user objects from source
-    with chdir(ctx.base_folder):
-        with tempfile.TemporaryDirectory("actions.ghcomponentizer") as action_dir:
-            ctx.run("git clone {} {}".format(repo_url, action_dir))
+    def componentize(source, target):
+        action_dir = _get_componentizer(ctx)
+        componentizer_script = os.path.join(action_dir, "componentize_cpy.py")
+        ghio = os.path.abspath(gh_io_folder or _get_ghio_folder(ctx))
 
-            if not gh_io_folder:
-                gh_io_folder = tempfile.mkdtemp("ghio")
-                import compas_ghpython
+        cmd = [sys.executable, componentizer_script, source, target, "--ghio", ghio]
+        if prefix:
+            cmd += ["--prefix", prefix]
 
-                compas_ghpython.fetch_ghio_lib(gh_io_folder)
+        # The componentizer loads GH_IO.dll through pythonnet. On macOS that means Mono,
+        # which needs the native libgdiplus to embed component icons. The embedded Mono
+        # does not search the Homebrew prefix the way the `mono` CLI does, so we point it
+        # there via DYLD_LIBRARY_PATH. We also run the interpreter directly instead of
+        # through `ctx.run` (which spawns a shell): macOS SIP strips DYLD_* across the
+        # protected /bin/sh, so otherwise the variable never reaches the subprocess.
+        subprocess.run(cmd, env=_componentizer_env(), check=True)
 
-            gh_io_folder = os.path.abspath(gh_io_folder)
-            componentizer_script = os.path.join(action_dir, "componentize_cpy.py")
-
-            cmd = [sys.executable, componentizer_script, source_dir, target_dir, "--ghio", gh_io_folder]
-            if prefix:
-                cmd += ["--prefix", prefix]
-
-            # The componentizer loads GH_IO.dll through pythonnet. On macOS that means Mono,
-            # which needs the native libgdiplus to embed component icons. The embedded Mono
-            # does not search the Homebrew prefix the way the `mono` CLI does, so we point it
-            # there via DYLD_LIBRARY_PATH. We also run the interpreter directly instead of
-            # through `ctx.run` (which spawns a shell): macOS SIP strips DYLD_* across the
-            # protected /bin/sh, so otherwise the variable never reaches the subprocess.
-            subprocess.run(cmd, env=_componentizer_env(), check=True)
+    # Build CPython Grasshopper user objects from source
+    with chdir(ctx.base_folder):
+        settings = ["cpython", prefix, dict(ctx.get("componentizer") or {})]
+        _build_components(source_dir, target_dir, componentize, settings, force=force, jobs=jobs)
 
 
 def _componentizer_env():
@@ -0,0 +1,160 @@
+import functools
+import hashlib
+import json
+import os
+import platform
+import shutil
+import tempfile
+
+
+def get_cache_dir(*parts, ctx=None):
+    """Return (and create) a folder inside the user-level cache of compas_invocations2.
+
+    The cache root is resolved in order from the ``cache_dir`` setting of the invoke
+    context, the ``COMPAS_INVOCATIONS_CACHE`` environment variable, and finally the
+    platform's conventional user cache folder.
+
+    Parameters
+    ----------
+    *parts : str
+        Sub-folders to append to the cache root.
+    ctx : :class:`invoke.Context`, optional
+        The invoke context, used to read the ``cache_dir`` setting.
+
+    Returns
+    -------
+    str
+        Absolute path of the cache folder.
+    """
+    root = (ctx.get("cache_dir") if ctx is not None else None) or os.environ.get("COMPAS_INVOCATIONS_CACHE")
+
+    if not root:
+        system = platform.system()
+        if system == "Windows":
+            base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~/AppData/Local")
+            root = os.path.join(base, "compas_invocations2", "Cache")
+        elif system == "Darwin":
+            root = os.path.expanduser("~/Library/Caches/compas_invocations2")
+        else:
+            base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+            root = os.path.join(base, "compas_invocations2")
+
+    path = os.path.abspath(os.path.join(root, *parts))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def cache_key(*values):
+    """Return a short, filesystem-safe key derived from the given values."""
+    return hashlib.sha256("\0".join(str(v) for v in values).encode("utf-8")).hexdigest()[:16]
+
+
+def file_digest(path, algorithm="sha256"):
+    """Return the hex digest of the content of a file, read in chunks."""
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dst):
+    """Make ``dst`` a copy of ``src`` that shares its data whenever the filesystem allows it.
+
+    A copy-on-write clone (reflink) is tried first, then a hardlink, and finally a regular
+    copy. Clones and copies can be modified independently of ``src``, hardlinks cannot:
+    never write into ``dst`` afterwards, replace it instead.
+
+    Parameters
+    ----------
+    src : str
+        The file to copy.
+    dst : str
+        The destination file. An existing file is replaced.
+
+    Returns
+    -------
+    str
+        How the file was copied: ``"reflink"``, ``"hardlink"`` or ``"copy"``.
+    """
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    if platform.system() == "Linux":
+        import fcntl
+
+        FICLONE = 0x40049409
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            shutil.copystat(src, dst)
+            return "reflink"
+        except OSError:
+            os.remove(dst)
+
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        shutil.copy2(src, dst)
+        return "copy"
+
+
+@functools.lru_cache(maxsize=None)
+def default_mode(folder=False):
+    """Return the permission bits of a new file (or folder) created with the current umask.
+
+    Temporary files and folders are created private (``0o600`` and ``0o700``), use this
+    to give them the permissions of a regularly created one before renaming them into place.
+    """
+    # the umask can only be read by setting it, read it once
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return (0o777 if folder else 0o666) & ~umask
+
+
+def atomic_write(path, data, mode=None):
+    """Write ``data`` to ``path`` through a temporary file and a rename.
+
+    Readers never observe a partially written file, and concurrent writers do not
+    corrupt each other: the last rename wins.
+
+    Parameters
+    ----------
+    path : str
+        Destination file.
+    data : str or bytes
+        Content to write. Strings are encoded as UTF-8.
+    mode : int, optional
+        Permission bits to set on the new file. Defaults to :func:`default_mode`.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".{}.".format(os.path.basename(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, mode if mode is not None else default_mode())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_json(path, default=None):
+    """Return the content of a JSON file, or ``default`` if it is missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(path, data):
+    """Atomically write ``data`` as compact JSON to ``path``."""
+    atomic_write(path, json.dumps(data, separators=(",", ":"), sort_keys=True))
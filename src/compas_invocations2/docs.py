@@ -1,7 +1,27 @@
+import ast
+import concurrent.futures
+import html
+import json
+import os
+import re
+import time
+import urllib.error
+import urllib.request
+
 import invoke
 
-from compas_invocations2.build import clean
+from compas_invocations2.cache import cache_key
+from compas_invocations2.cache import get_cache_dir
+from compas_invocations2.cache import read_json
+from compas_invocations2.cache import write_json
 from compas_invocations2.console import chdir
+from compas_invocations2.fingerprint import fingerprinted
+
+# External links in the built HTML pages.
+EXTERNAL_LINK = re.compile(r"""(?:href|src)=["'](https?://[^"'\s]+)["']""")
+
+# Timeout in seconds of a single link check request.
+LINKCHECK_TIMEOUT = 15
 
 
 @invoke.task(default=True)
@@ -11,33 +31,218 @@ def help(ctx):
     print('Use "invoke -h <taskname>" to get detailed help for a task.')
 
 
+def _doctree_dir(ctx):
+    """Return the folder of the doctree cache, shared by ``invoke docs`` and ``invoke linkcheck``.
+
+    It is set with the ``docs.doctree_dir`` setting and defaults to a folder of the
+    user-level cache, so that it survives ``invoke clean``.
+    """
+    path = (ctx.get("docs") or {}).get("doctree_dir")
+    if path:
+        return os.path.join(ctx.base_folder, path)
+    return get_cache_dir("sphinx", cache_key(os.path.abspath(ctx.base_folder)), "doctrees", ctx=ctx)
+
+
+def _sphinx_opts(ctx, doctree_dir, jobs):
+    jobs = jobs or (ctx.get("docs") or {}).get("jobs") or "auto"
+    return '-d "{}" -j {}'.format(doctree_dir, jobs)
+
+
+@fingerprinted(inputs=["docs/**/*", "src/**/*.py"], outputs=["dist/docs/**/*"], args=[], name="docs.html", store=True)
+def _build_html(ctx, doctree_dir, jobs, fresh=False):
+    opts = _sphinx_opts(ctx, doctree_dir, jobs) + (" -E" if fresh else "")
+    ctx.run("sphinx-build {} -b html docs dist/docs".format(opts))
+
+
+def _extract_links(html_dir):
+    """Return the external links of all HTML pages in ``html_dir``, mapped to the pages that contain them."""
+    links = {}
+    for root, dirs, files in os.walk(html_dir):
+        dirs[:] = [d for d in dirs if not d.startswith((".", "_"))]
+        for filename in files:
+            if not filename.endswith(".html"):
+                continue
+            path = os.path.join(root, filename)
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for url in EXTERNAL_LINK.findall(f.read()):
+                    url = html.unescape(url).split("#")[0]
+                    links.setdefault(url, set()).add(os.path.relpath(path, html_dir).replace(os.sep, "/"))
+    return links
+
+
+def _check_url(url, timeout=LINKCHECK_TIMEOUT):
+    """Request ``url`` and return whether it is reachable and the HTTP status or error."""
+    headers = {"User-Agent": "Mozilla/5.0 (compatible; compas_invocations2 linkcheck)"}
+    for method in ("HEAD", "GET"):
+        request = urllib.request.Request(url, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return True, response.status
+        except urllib.error.HTTPError as e:
+            # some servers refuse HEAD requests, retry those with GET
+            if method == "HEAD" and e.code in (403, 405, 501):
+                continue
+            return False, e.code
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            return False, str(getattr(e, "reason", e))
+    return False, "unreachable"
+
+
+def _check_links(urls, cache_path, ttl_ok, ttl_broken, refresh=False, workers=16):
+    """Check a set of URLs, only requesting the ones whose cached result expired.
+
+    Returns
+    -------
+    tuple
+        The ``{url: [ok, status, checked_at]}`` results and the number of cache hits.
+    """
+    cache = {} if refresh else read_json(cache_path, {})
+    now = time.time()
+
+    results = {}
+    expired = []
+    for url in urls:
+        cached = cache.get(url)
+        if cached and now - cached[2] < (ttl_ok if cached[0] else ttl_broken):
+            results[url] = cached
+        else:
+            expired.append(url)
+    hits = len(results)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for url, (ok, status) in zip(expired, executor.map(_check_url, expired)):
+            results[url] = [ok, status, now]
+
+    if expired:
+        cache = read_json(cache_path, {}) if not refresh else {}
+        cache.update((url, results[url]) for url in expired)
+        write_json(cache_path, cache)
+    return results, hits
+
+
+def _sphinx_linkcheck_ignore(conf_path, log=print):
+    """Return the ``linkcheck_ignore`` patterns of a sphinx ``conf.py``, without executing it.
+
+    Only literal values can be read. A warning is logged for any other ``linkcheck_*``
+    option, as they are not supported by the link check.
+    """
+    try:
+        with open(conf_path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), conf_path)
+    except (OSError, SyntaxError, ValueError):
+        return []
+
+    patterns = []
+    for node in tree.body:
+        if not isinstance(node, (ast.Assign, ast.AnnAssign)) or node.value is None:
+            continue
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        for name in (t.id for t in targets if isinstance(t, ast.Name) and t.id.startswith("linkcheck_")):
+            if name != "linkcheck_ignore":
+                log("⚠️ {} in {} is not supported and is ignored.".format(name, conf_path))
+                continue
+            try:
+                patterns = list(ast.literal_eval(node.value))
+            except (TypeError, ValueError):
+                log("⚠️ linkcheck_ignore in {} is not a literal list and is ignored.".format(conf_path))
+    return patterns
+
+
+def _linkcheck(ctx, refresh=False, log=print):
+    """Check the external links of the built HTML docs and write a report to ``dist/linkcheck``.
+
+    URLs matching the ``linkcheck_ignore`` patterns of ``docs/conf.py`` or the ``linkcheck.ignore``
+    setting are skipped. Messages are passed to ``log``, e.g. to buffer them while other checks run.
+    """
+    settings = ctx.get("linkcheck") or {}
+    patterns = _sphinx_linkcheck_ignore(os.path.join("docs", "conf.py"), log) + list(settings.get("ignore") or [])
+    ignore = [re.compile(pattern) for pattern in patterns]
+
+    links = _extract_links("dist/docs")
+    urls = sorted(url for url in links if not any(pattern.match(url) for pattern in ignore))
+
+    cache_path = os.path.join(get_cache_dir("linkcheck", ctx=ctx), "links.json")
+    results, hits = _check_links(
+        urls,
+        cache_path,
+        ttl_ok=settings.get("ttl_ok", 7 * 24 * 3600),
+        ttl_broken=settings.get("ttl_broken", 3600),
+        refresh=refresh,
+        workers=settings.get("workers", 16),
+    )
+
+    broken = [url for url in urls if not results[url][0]]
+    os.makedirs("dist/linkcheck", exist_ok=True)
+    with open("dist/linkcheck/output.json", "w") as f:
+        for url in urls:
+            ok, status, _ = results[url]
+            report = {"uri": url, "status": "working" if ok else "broken", "info": status, "pages": sorted(links[url])}
+            f.write(json.dumps(report) + "\n")
+
+    for url in broken:
+        log("❌ {} ({}) in {}".format(url, results[url][1], ", ".join(sorted(links[url]))))
+
+    hit_rate = 100.0 * hits / len(urls) if urls else 100.0
+    log(
+        "Checked {} links: {} from cache ({:.0f}% hit rate), {} requested, {} broken.".format(
+            len(urls), hits, hit_rate, len(urls) - hits, len(broken)
+        )
+    )
+    if broken:
+        raise invoke.Exit("Found {} broken link(s).".format(len(broken)), code=1)
+
+
 @invoke.task(
     help={
-        "rebuild": "True to clean all previously built docs before starting, otherwise False.",
+        "rebuild": "True to re-read all documents instead of only new and changed ones, otherwise False.",
         "doctest": "True to run doctests, otherwise False.",
         "check_links": "True to check all web links in docs for validity, otherwise False.",
+        "jobs": "(Optional) Number of parallel sphinx processes. Defaults to the `docs.jobs` setting or `auto`.",
     }
 )
-def docs(ctx, doctest=False, rebuild=False, check_links=False):
-    """Builds the HTML documentation."""
+def docs(ctx, doctest=False, rebuild=False, check_links=False, jobs=None):
+    """Builds the HTML documentation.
+
+    Builds are incremental: the doctrees are cached outside of ``dist/``, so only new
+    and changed documents are read again, and sphinx does not run at all when nothing
+    in ``docs/`` and ``src/`` changed since the last build. Autodoc records the python
+    modules a document pulls docstrings from, so documents of changed modules are read
+    again as well. ``--rebuild`` re-reads all documents, but keeps ``docs/api/generated``.
 
-    if rebuild:
-        clean(ctx)
+    """
+    doctree_dir = _doctree_dir(ctx)
 
     with chdir(ctx.base_folder):
         if doctest:
             ctx.run("pytest --doctest-modules")
 
-        opts = "-E" if rebuild else ""
-        ctx.run("sphinx-build {} -b html docs dist/docs".format(opts))
+        _build_html(ctx, doctree_dir, jobs, fresh=rebuild, force=rebuild)
 
         if check_links:
-            linkcheck(ctx, rebuild=rebuild)
+            print("Running link check...")
+            _linkcheck(ctx)
+
+
+@invoke.task(
+    help={
+        "rebuild": "True to re-read all documents instead of only new and changed ones, otherwise False.",
+        "jobs": "(Optional) Number of parallel sphinx processes. Defaults to the `docs.jobs` setting or `auto`.",
+        "refresh": "True to ignore cached results and check every link again, otherwise False.",
+    }
+)
+def linkcheck(ctx, rebuild=False, jobs=None, refresh=False):
+    """Check links in documentation.
 
+    Results are cached per URL: working links are only checked again after ``linkcheck.ttl_ok``
+    seconds (defaults to a week) and broken ones after ``linkcheck.ttl_broken`` seconds (defaults
+    to an hour). URLs matching any of the ``linkcheck_ignore`` regular expressions of ``docs/conf.py``
+    or of the ``linkcheck.ignore`` setting are skipped. Other ``linkcheck_*`` options of ``conf.py``
+    are not supported.
 
-@invoke.task()
-def linkcheck(ctx, rebuild=False):
-    """Check links in documentation."""
+    """
     print("Running link check...")
-    opts = "-E" if rebuild else ""
-    ctx.run("sphinx-build {} -b linkcheck docs dist/docs".format(opts))
+    doctree_dir = _doctree_dir(ctx)
+
+    with chdir(ctx.base_folder):
+        _build_html(ctx, doctree_dir, jobs, fresh=rebuild, force=rebuild)
+        _linkcheck(ctx, refresh=refresh)
@@ -0,0 +1,233 @@
+"""Skip tasks whose outputs are up to date with their inputs.
+
+A task decorated with :func:`fingerprinted` declares its input files (glob patterns),
+the settings and arguments that affect its outputs, and its output files. After every
+successful run, a fingerprint of all of them is stored in a small per-project database
+in the user-level cache, and the next run is skipped if nothing changed.
+
+Files whose modification time and size did not change since they were last seen are
+not hashed again. Set the ``COMPAS_INVOCATIONS_FORCE`` environment variable, or pass
+``force=True`` to a decorated task, to always run it.
+"""
+
+import functools
+import glob
+import hashlib
+import inspect
+import json
+import os
+import re
+import threading
+
+from compas_invocations2 import artifacts
+from compas_invocations2.cache import cache_key
+from compas_invocations2.cache import file_digest
+from compas_invocations2.cache import get_cache_dir
+from compas_invocations2.cache import read_json
+from compas_invocations2.cache import write_json
+
+# serializes the read-modify-write cycles of the database, tasks may run on threads (e.g. `release`)
+_LOCK = threading.Lock()
+
+
+def _database_path(ctx):
+    return os.path.join(get_cache_dir("fingerprints", ctx=ctx), cache_key(os.path.abspath(ctx.base_folder)) + ".json")
+
+
+def _expand(ctx, patterns, args):
+    """Return the sorted, absolute paths of the files matching the given patterns.
+
+    Patterns are relative to ``base_folder``. Callables are called with the arguments
+    of the task and return more patterns.
+    """
+    paths = set()
+    for pattern in patterns:
+        if callable(pattern):
+            paths.update(_expand(ctx, pattern(**args), args))
+            continue
+        pattern = os.path.join(ctx.base_folder, pattern)
+        for path in glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]:
+            if os.path.isfile(path) and "__pycache__" not in path and not path.endswith(".pyc"):
+                paths.add(os.path.abspath(path))
+    return sorted(paths)
+
+
+def _stat(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _outputs_state(paths):
+    """Return a digest of the paths, modification times and sizes of the outputs, or None if there are none."""
+    if not paths:
+        return None
+    state = json.dumps([[path] + _stat(path) for path in paths])
+    return hashlib.sha256(state.encode("utf-8")).hexdigest()[:32]
+
+
+def files_digest(ctx, paths, *extra):
+    """Return a digest of the paths and contents of a set of files.
+
+    The content hash of a file is reused as long as its modification time and size did
+    not change.
+
+    Parameters
+    ----------
+    ctx : :class:`invoke.Context`
+        The invoke context.
+    paths : list of str
+        Paths of the input files.
+    *extra : str
+        Additional values that affect the output, e.g. a version or build flags.
+
+    Returns
+    -------
+    str
+    """
+    path = _database_path(ctx)
+    with _LOCK:
+        database = read_json(path, {})
+        hashes = database.setdefault("files", {})
+        digest = _files_digest(ctx, paths, extra, hashes)
+        _save(path, database)
+    return digest
+
+
+def _files_digest(ctx, paths, extra, hashes):
+    # paths are hashed relative to `base_folder`, so that identical trees in different checkouts match
+    base_folder = os.path.abspath(ctx.base_folder)
+    digest = hashlib.sha256()
+    for value in extra:
+        digest.update("{}\0".format(value).encode("utf-8"))
+    for path in sorted(set(os.path.abspath(p) for p in paths)):
+        stat = _stat(path)
+        known = hashes.get(path)
+        if not known or known[:2] != stat:
+            known = hashes[path] = stat + [file_digest(path)[:32]]
+        relative = os.path.relpath(path, base_folder).replace(os.sep, "/")
+        digest.update("{}\0{}\0".format(relative, known[2]).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def _save(path, database):
+    # forget files that were deleted, so that the database does not grow forever
+    database["files"] = {p: v for p, v in database.get("files", {}).items() if os.path.exists(p)}
+    write_json(path, database)
+
+
+def invalidate(ctx, name):
+    """Forget the fingerprint of a task, so that it runs the next time it is called."""
+    path = _database_path(ctx)
+    with _LOCK:
+        database = read_json(path, {})
+        if database.get("tasks", {}).pop(name, None) is not None:
+            _save(path, database)
+
+
+def fingerprinted(inputs, outputs, config=(), args=None, name=None, store=False):
+    """Skip the decorated task when its inputs, settings and outputs did not change since its last run.
+
+    The decorated function must take the invoke context as first argument. Apply it
+    below ``@invoke.task``, so that the task keeps the signature of the function.
+
+    Parameters
+    ----------
+    inputs : list of str or callable
+        Glob patterns of the input files, relative to ``base_folder``. Callables are
+        called with the arguments of the task (including ``ctx``) and return more patterns.
+    outputs : list of str or callable
+        Glob patterns of the output files, like ``inputs``. The task runs if any of them
+        is missing or was modified since the last run.
+    config : list of str, optional
+        Dotted keys of the settings that affect the outputs, e.g. ``"ghuser.prefix"``.
+    args : list of str, optional
+        Names of the arguments that affect the outputs. Defaults to all arguments except
+        ``ctx`` and ``force``.
+    name : str, optional
+        Key of the task in the database. Defaults to the qualified name of the function.
+    store : bool, optional
+        True to restore the outputs from the artifact store (see :mod:`compas_invocations2.artifacts`)
+        instead of running the task when they were already built from identical inputs, and
+        to publish them to the store otherwise.
+
+    Returns
+    -------
+    callable
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        params = list(signature.parameters)
+        key = name or "{}.{}".format(func.__module__, func.__qualname__)
+        label = key.rpartition(".")[2]
+        takes_force = "force" in params
+
+        @functools.wraps(func)
+        def wrapper(*call_args, **kwargs):
+            force = False if takes_force else kwargs.pop("force", False)
+            bound = signature.bind(*call_args, **kwargs)
+            bound.apply_defaults()
+            values = dict(bound.arguments)
+            if takes_force:
+                # also when passed positionally
+                force = values["force"]
+            ctx = values[params[0]]
+
+            relevant = args if args is not None else [p for p in params[1:] if p != "force"]
+            settings = [_setting(ctx, k) for k in config]
+            extra = [json.dumps([values.get(a) for a in relevant] + settings, sort_keys=True, default=str)]
+
+            path = _database_path(ctx)
+            with _LOCK:
+                database = read_json(path, {})
+                digest = _files_digest(ctx, _expand(ctx, inputs, values), extra, database.setdefault("files", {}))
+                previous = database.setdefault("tasks", {}).get(key)
+                _save(path, database)
+
+            outputs_state = _outputs_state(_expand(ctx, outputs, values))
+            forced = force or os.environ.get("COMPAS_INVOCATIONS_FORCE")
+            if not forced and outputs_state and previous == [digest, outputs_state]:
+                print("{} is up to date, skipping it.".format(label))
+                return None
+
+            # forced runs rebuild, but still publish their outputs
+            store_key = "{}-{}".format(re.sub(r"\W", "_", key), digest) if store else None
+            restored = None
+            if store_key and not forced:
+                restored = artifacts.restore(ctx, store_key, replace=_expand(ctx, outputs, values))
+            if restored:
+                print("Restored {} file(s) of {} from the artifact store.".format(len(restored), label))
+                result = None
+            else:
+                result = func(*call_args, **kwargs)
+                if store_key:
+                    artifacts.publish(ctx, store_key, _expand(ctx, outputs, values))
+
+            outputs_state = _outputs_state(_expand(ctx, outputs, values))
+            with _LOCK:
+                database = read_json(path, {})
+                database.setdefault("tasks", {})[key] = [digest, outputs_state]
+                _save(path, database)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _setting(ctx, key):
+    value = ctx
+    for part in key.split("."):
+        value = value.get(part) if hasattr(value, "get") else None
+        if value is None:
+            return None
+    return _plain(value)
+
+
+def _plain(value):
+    """Convert settings (e.g. invoke's ``DataProxy``) to plain, JSON serializable values."""
+    if hasattr(value, "items"):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
@@ -0,0 +1,29 @@
+import invoke
+
+
+def changed_files(ctx, ref="HEAD"):
+    """Return the files that are modified, staged or untracked compared to a git ref.
+
+    Paths are relative to the current working directory, with forward slashes. Deleted
+    files, and both paths of renamed files, are included, so callers need to check that
+    a file exists before using it.
+
+    Parameters
+    ----------
+    ctx : :class:`invoke.Context`
+        The invoke context.
+    ref : str
+        The git ref (commit, branch, tag...) to compare against.
+
+    Returns
+    -------
+    list of str
+    """
+    # without renames detection, so that the old path of a renamed file is listed as well
+    diff = ctx.run('git diff --name-only --no-renames --relative "{}"'.format(ref), hide=True, warn=True)
+    if not diff.ok:
+        raise invoke.Exit("Failed to list the files changed since `{}`:\n{}".format(ref, diff.stderr))
+
+    untracked = ctx.run("git ls-files --others --exclude-standard", hide=True, warn=True)
+    files = diff.stdout.splitlines() + (untracked.stdout.splitlines() if untracked.ok else [])
+    return sorted(set(f.strip() for f in files if f.strip()))
@@ -6,21 +6,34 @@ Andrea Settimi, Damien Gilliard, Eleni Skevaki, Marirena Kladeftira (IBOIS, CRCL
 It is distributed under the MIT License, provided this attribution is retained.
 """
 
+import concurrent.futures
+import glob
 import os
 import platform
 import re
+import shlex
 import shutil
 import subprocess
 import tempfile
+import time
+import zipfile
 from pathlib import Path
 from typing import List
 from typing import Optional
 
 import invoke
-import requests
-import tomlkit
 
+from compas_invocations2 import artifacts
+from compas_invocations2.cache import atomic_write
+from compas_invocations2.cache import cache_key
+from compas_invocations2.cache import default_mode
+from compas_invocations2.cache import get_cache_dir
+from compas_invocations2.cache import link_or_copy
+from compas_invocations2.cache import read_json
+from compas_invocations2.cache import write_json
 from compas_invocations2.console import chdir
+from compas_invocations2.fingerprint import files_digest as fingerprint_files
+from compas_invocations2.project import load_project
 
 YAK_URL = r"https://files.mcneel.com/yak/tools/latest/yak.exe"
 
@@ -32,15 +45,85 @@ RHINO_YAK_PATHS = [
 ]
 
 
-def _download_yak_executable(target_dir: str):
-    response = requests.get(YAK_URL)
-    if response.status_code != 200:
-        raise ValueError(f"Failed to download the yak.exe from url:{YAK_URL} with error : {response.status_code}")
+# (connect, read) timeouts in seconds and number of retries for downloading yak.exe
+YAK_TIMEOUT = (10, 60)
+YAK_RETRIES = 3
 
+# Delay in seconds before the first retry of a failed `yak push`, doubled on every retry.
+YAK_PUBLISH_BACKOFF = 2.0
+
+# Output of failed pushes that will not succeed when retried.
+YAK_PERMANENT_ERRORS = re.compile(r"already exists|\b(400|401|403|409)\b|unauthori[sz]ed|forbidden", re.IGNORECASE)
+
+# Timestamp of all entries of the packages written by the built-in packer, the earliest one zip supports.
+YAK_TIMESTAMP = (1980, 1, 1, 0, 0, 0)
+
+# Fingerprint of the inputs of the last yak package built in `dist/yak_package`.
+YAK_FINGERPRINT = ".yak_package.json"
+
+# yak executables already revalidated in this process, keyed by url
+_YAK_EXECUTABLES = {}
+
+
+def _download_yak_executable(url: str = YAK_URL, ctx=None) -> str:
+    """Return the path to a cached ``yak.exe``, downloading or revalidating it first.
+
+    The executable is streamed to a persistent user-level cache, shared by all tasks.
+    A cached copy is revalidated with ``If-None-Match``/``If-Modified-Since`` once per
+    process, and is used as-is when the server cannot be reached.
+    """
+    if url in _YAK_EXECUTABLES:
+        return _YAK_EXECUTABLES[url]
+
+    # deferred, so that merely loading the tasks (e.g. `invoke --list`) does not pay for it
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    cache_dir = get_cache_dir("yak", cache_key(url), ctx=ctx)
     # absolute, because callers run yak from inside a different working directory
-    target_path = os.path.abspath(os.path.join(target_dir, "yak.exe"))
-    with open(target_path, "wb") as f:
-        f.write(response.content)
+    target_path = os.path.join(cache_dir, "yak.exe")
+    meta_path = os.path.join(cache_dir, "yak.json")
+    meta = read_json(meta_path, {}) if os.path.isfile(target_path) else {}
+
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    session = requests.Session()
+    retries = Retry(total=YAK_RETRIES, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    session.mount("http://", HTTPAdapter(max_retries=retries))
+    session.mount("https://", HTTPAdapter(max_retries=retries))
+
+    try:
+        with session.get(url, headers=headers, stream=True, timeout=YAK_TIMEOUT) as response:
+            if response.status_code == 304:
+                print("Using cached yak.exe")
+            elif response.status_code != 200:
+                raise ValueError(f"Failed to download the yak.exe from url:{url} with error : {response.status_code}")
+            else:
+                fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=".yak.exe.", suffix=".tmp")
+                try:
+                    with os.fdopen(fd, "wb") as f:
+                        for chunk in response.iter_content(chunk_size=1024 * 1024):
+                            f.write(chunk)
+                    os.chmod(tmp_path, 0o755)
+                    os.replace(tmp_path, target_path)
+                except BaseException:
+                    os.remove(tmp_path)
+                    raise
+                write_json(
+                    meta_path,
+                    {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")},
+                )
+    except requests.RequestException as e:
+        if not os.path.isfile(target_path):
+            raise ValueError(f"Failed to download the yak.exe from url:{url} with error : {e}")
+        print(f"Could not revalidate yak.exe ({e}), using the cached copy.")
+
+    _YAK_EXECUTABLES[url] = target_path
     return target_path
 
 
@@ -52,8 +135,8 @@ def _find_native_yak() -> Optional[str]:
     return shutil.which("yak")
 
 
-def _get_yak_command(download_dir: str) -> List[str]:
-    """Return the argv prefix used to invoke yak, downloading ``yak.exe`` if needed.
+def _get_yak_command(ctx=None) -> List[str]:
+    """Return the argv prefix used to invoke yak, fetching the cached ``yak.exe`` if needed.
 
     The only yak binary McNeel publishes for download is a .NET Framework ``yak.exe``.
     On Windows it runs as-is. Elsewhere it needs a runtime, so we prefer the native
@@ -61,7 +144,7 @@ def _get_yak_command(download_dir: str) -> List[str]:
     on PATH, and fall back to running the downloaded ``yak.exe`` under Mono.
     """
     if platform.system() == "Windows":
-        return [_download_yak_executable(download_dir)]
+        return [_download_yak_executable(ctx=ctx)]
 
     native_yak = _find_native_yak()
     if native_yak:
@@ -73,7 +156,7 @@ def _get_yak_command(download_dir: str) -> List[str]:
             "No yak executable available. Install Rhino (which bundles the `yak` CLI) "
             "or install Mono (`brew install mono`) so that the downloaded yak.exe can be run."
         )
-    return [mono, _download_yak_executable(download_dir)]
+    return [mono, _download_yak_executable(ctx=ctx)]
 
 
 def _set_version_in_manifest(manifest_path: str, version: str):
@@ -103,30 +186,6 @@ def _clear_directory(path_to_dir):
             raise invoke.Exit(f"Failed to delete {file_path}: {e}")
 
 
-def _get_version_from_toml(toml_file: str) -> str:
-    with open(toml_file, "r") as f:
-        pyproject_data = tomlkit.load(f)
-    if not pyproject_data:
-        raise invoke.Exit("Failed to load pyproject.toml.")
-
-    version = pyproject_data.get("tool", {}).get("bumpversion", {}).get("current_version", None)
-    if not version:
-        raise invoke.Exit("Failed to get version from pyproject.toml. Please provide a version number.")
-    return version
-
-
-def _get_package_name(toml_file: str) -> str:
-    with open(toml_file, "r") as f:
-        pyproject_data = tomlkit.load(f)
-    if not pyproject_data:
-        raise invoke.Exit("Failed to load pyproject.toml.")
-
-    name = pyproject_data.get("project", {}).get("name", None)
-    if not name:
-        raise invoke.Exit("Failed to get package name. Is your pyproject.toml missing a '[project]' section?")
-    return name
-
-
 def _sanitize_dependency(dep: str) -> str:
     # HACK: Remove upper bound constraints (e.g., ", <3" or ",<3") as Rhino currenly doesn't support them
     # https://discourse.mcneel.com/t/python-dependencies-with-ordered-comparison-syntax/212304
@@ -135,33 +194,6 @@ def _sanitize_dependency(dep: str) -> str:
     return sanitized
 
 
-def _get_deps_from_requirements(req_filepath: str) -> str:
-    with open(req_filepath, "r") as req_file:
-        dependencies = []
-        for line in req_file:
-            line = line.strip()
-            if line and not line.startswith("#"):
-                dependencies.append(_sanitize_dependency(line))
-        return dependencies
-
-
-def _get_dependencies(base_folder: str) -> List[str]:
-    toml_filepath = os.path.join(base_folder, "pyproject.toml")
-    with open(toml_filepath, "r") as f:
-        toml = tomlkit.load(f)
-
-    dependencies = toml.get("project", {}).get("dependencies")
-    if dependencies:
-        return [_sanitize_dependency(dep) for dep in dependencies]
-
-    dynamic_deps = toml.get("tool", {}).get("setuptools", {}).get("dynamic", {}).get("dependencies")
-    if dynamic_deps and "file" in dynamic_deps:
-        req_filepath = os.path.join(base_folder, dynamic_deps["file"])
-        return _get_deps_from_requirements(req_filepath)
-
-    return []
-
-
 def _get_user_object_path(context):
     if hasattr(context, "ghuser_cpython"):
         print("checking ghuser_cpython")
@@ -202,6 +234,67 @@ def _resolve_yak_path(ctx, key: str, value: Optional[str], description: str) ->
     return path
 
 
+def _manifest_value(manifest: str, key: str) -> Optional[str]:
+    match = re.search(rf"^{key}\s*:\s*(.+?)\s*$", manifest, re.MULTILINE)
+    return match.group(1).strip("'\"") if match else None
+
+
+def _pack_yak(package_dir: str) -> str:
+    """Pack the staged files of ``package_dir`` into a ``.yak`` archive, without the yak executable.
+
+    A yak package is a zip archive with ``manifest.yml`` at its root. Entries are written
+    in sorted order with fixed timestamps and permissions, so that identical inputs produce
+    byte-identical packages. Returns the filename of the package, following the
+    ``<name>-<version>-any-any.yak`` convention of ``yak build --platform any``.
+    """
+    with open(os.path.join(package_dir, "manifest.yml"), "r", encoding="utf-8") as f:
+        manifest = f.read()
+    name = _manifest_value(manifest, "name")
+    version = _manifest_value(manifest, "version")
+    if not name or not version:
+        raise invoke.Exit("The manifest must define both a `name` and a `version`.")
+
+    entries = []
+    for root, _, files in os.walk(package_dir):
+        for f in files:
+            if not f.endswith(".yak"):
+                entries.append(os.path.relpath(os.path.join(root, f), package_dir).replace(os.sep, "/"))
+
+    filename = f"{name}-{version}-any-any.yak"
+    fd, tmp_path = tempfile.mkstemp(dir=package_dir, prefix=f".{filename}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w") as archive:
+            for entry in sorted(entries):
+                info = zipfile.ZipInfo(entry, date_time=YAK_TIMESTAMP)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.create_system = 3  # unix, so that the attributes do not depend on the building OS
+                info.external_attr = 0o644 << 16
+                with open(os.path.join(package_dir, entry), "rb") as src, archive.open(info, "w") as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.chmod(tmp_path, default_mode())
+        os.replace(tmp_path, os.path.join(package_dir, filename))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return filename
+
+
+def _link_yak_targets(target_dir: str, source: str, package: str, targets: List[str]) -> List[str]:
+    """Make the built package available under the filename of every target Rhino version.
+
+    ``package`` is the ``any-any`` filename produced by ``yak build``, and ``source`` an
+    existing file in ``target_dir`` with the same content. Returns the target filenames.
+    """
+    files = []
+    for target in targets:
+        filename = package.replace("any-any", f"{target}-any")
+        if filename != source:
+            link_or_copy(os.path.join(target_dir, source), os.path.join(target_dir, filename))
+        files.append(filename)
+    return files
+
+
 @invoke.task(
     help={
         "manifest_path": "(Optional) Path to the manifest file. Defaults to the `yak.manifest_path` setting.",
@@ -210,7 +303,10 @@ def _resolve_yak_path(ctx, key: str, value: Optional[str], description: str) ->
         "readme_path": "(Optional) Path to the readme file.",
         "license_path": "(Optional) Path to the license file.",
         "version": "(Optional) The version number to set in the manifest file.",
-        "target_rhino": "(Optional) The target Rhino version for the package. Defaults to 'rh8'.",
+        "target_rhino": "(Optional) Comma-separated target Rhino versions, e.g. `rh7,rh8`. Defaults to 'rh8'.",
+        "force": "True to build the package even if none of its inputs changed, otherwise False.",
+        "external_yak": "True to build with the yak executable instead of the built-in packer. "
+        "Defaults to the `yak.external` setting.",
     }
 )
 def yakerize(
@@ -222,14 +318,26 @@ def yakerize(
     license_path: str = None,
     version: str = None,
     target_rhino: str = "rh8",
+    force: bool = False,
+    external_yak: bool = False,
 ) -> bool:
-    """Create a Grasshopper YAK package from the current project."""
+    """Create a Grasshopper YAK package from the current project.
+
+    The package is built once and linked under one filename per target Rhino version.
+    It is packed in-process, reproducibly, unless the yak executable is requested with
+    ``--external-yak`` or the ``yak.external`` setting.
+    Inputs are staged with reflinks or hardlinks where the filesystem supports them, and
+    the build is skipped when the inputs and version match the existing package.
+
+    """
     # https://developer.rhino3d.com/guides/yak/the-anatomy-of-a-package/
-    if target_rhino.split("_")[0] not in ["rh6", "rh7", "rh8"]:
-        raise invoke.Exit(
-            f"""Invalid target Rhino version `{target_rhino}`. Must be one of: rh6, rh7, rh8. 
-            Minor version is optional and can be appended with a '_' (e.g. rh8_15)."""
-        )
+    targets = list(dict.fromkeys(t.strip() for t in target_rhino.split(",") if t.strip()))
+    for target in targets or [target_rhino]:
+        if target.split("_")[0] not in ["rh6", "rh7", "rh8"]:
+            raise invoke.Exit(
+                f"""Invalid target Rhino version `{target}`. Must be one of: rh6, rh7, rh8. 
+                Minor version is optional and can be appended with a '_' (e.g. rh8_15)."""
+            )
     manifest_path = _resolve_yak_path(ctx, "manifest_path", manifest_path, "manifest file")
     logo_path = _resolve_yak_path(ctx, "logo_path", logo_path, "logo file")
 
@@ -245,11 +353,32 @@ def yakerize(
     if not os.path.exists(license_path):
         raise invoke.Exit(f"License file not found at {license_path}. Please provide a valid path.")
 
-    version = version or _get_version_from_toml(os.path.join(ctx.base_folder, "pyproject.toml"))
+    version = version or load_project(ctx.base_folder).version
+    external_yak = external_yak or bool((ctx.get("yak") or {}).get("external"))
     target_dir = os.path.join(ctx.base_folder, "dist", "yak_package")
+    # kept outside of the staging folder, which is emptied on every build
+    fingerprint_path = os.path.join(ctx.base_folder, "dist", YAK_FINGERPRINT)
+
+    ghuser_files = sorted(
+        os.path.join(gh_components_dir, f) for f in os.listdir(gh_components_dir) if f.endswith(".ghuser")
+    )
+    # the content of the package does not depend on the target, only its filename does
+    fingerprint = fingerprint_files(
+        ctx,
+        [manifest_path, logo_path, readme_path, license_path] + ghuser_files,
+        version,
+        "external" if external_yak else "native",
+    )
+    previous = read_json(fingerprint_path, {})
+    built = [f for f in previous.get("files", []) if os.path.isfile(os.path.join(target_dir, f))]
+    if not force and previous.get("fingerprint") == fingerprint and previous.get("package") and built:
+        print("Yak package is up to date, skipping the build. Use --force to rebuild it.")
+        files = _link_yak_targets(target_dir, built[0], previous["package"], targets)
+        write_json(fingerprint_path, dict(previous, files=sorted(set(built + files))))
+        return
 
     #####################################################################
-    # Copy manifest, logo, misc folder (readme, license, etc)
+    # Stage manifest, logo, misc folder (readme, license, etc)
     #####################################################################
     # if target dit exists, make sure it's empty
     if os.path.exists(target_dir) and os.path.isdir(target_dir):
@@ -257,81 +386,193 @@ def yakerize(
     else:
         os.makedirs(target_dir, exist_ok=False)
 
-    # yak only recognizes a manifest named `manifest.yml`, regardless of the source filename
+    # packages built from identical inputs (e.g. on another branch or CI job) are taken from the artifact store
+    store_key = f"yakerize-{fingerprint}"
+    restored = None if force else artifacts.restore(ctx, store_key)
+    if restored:
+        taget_file = os.path.basename(restored[0])
+        print(f"Restored {taget_file} from the artifact store.")
+    else:
+        inputs = [manifest_path, logo_path, readme_path, license_path, ghuser_files]
+        taget_file = _build_yak_package(ctx, target_dir, *inputs, version=version, external_yak=external_yak)
+        artifacts.publish(ctx, store_key, [os.path.join(target_dir, taget_file)])
+
+    with chdir(target_dir):
+        files = _link_yak_targets(target_dir, taget_file, taget_file, targets)
+        os.remove(taget_file)
+
+    write_json(fingerprint_path, {"fingerprint": fingerprint, "package": taget_file, "files": files})
+
+
+def _build_yak_package(
+    ctx,
+    target_dir: str,
+    manifest_path: str,
+    logo_path: str,
+    readme_path: str,
+    license_path: str,
+    ghuser_files: List[str],
+    version: str,
+    external_yak: bool,
+) -> str:
+    """Stage the inputs of a package in the empty ``target_dir`` and build it. Returns the package filename."""
+    # yak only recognizes a manifest named `manifest.yml`, regardless of the source filename.
+    # it is edited in place, so it must be a real copy and never a link to the source file.
     manifest_target = shutil.copy(manifest_path, os.path.join(target_dir, "manifest.yml"))
     _set_version_in_manifest(manifest_target, version)
-    shutil.copy(logo_path, target_dir)
 
+    # the other inputs are only read by yak, so they share data with their source when possible
     path_miscdir: str = os.path.join(target_dir, "misc")
     os.makedirs(path_miscdir, exist_ok=False)
-    shutil.copy(readme_path, path_miscdir)
-    shutil.copy(license_path, path_miscdir)
-
-    for f in os.listdir(gh_components_dir):
-        if f.endswith(".ghuser"):
-            shutil.copy(os.path.join(gh_components_dir, f), target_dir)
+    sources = [logo_path, readme_path, license_path] + ghuser_files
+    folders = [target_dir, path_miscdir, path_miscdir] + [target_dir] * len(ghuser_files)
+    staged = [os.path.join(folder, os.path.basename(f)) for f, folder in zip(sources, folders)]
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        list(executor.map(link_or_copy, sources, staged))
 
     #####################################################################
-    # Yak exe
+    # Pack, or build with the yak exe
     #####################################################################
 
-    # yak executable shouldn't be in the target directory, otherwise it will be included in the package
-    target_parent = os.sep.join(target_dir.split(os.sep)[:-1])
-    try:
-        yak_cmd = _get_yak_command(target_parent)
-    except ValueError:
-        raise invoke.Exit("Failed to download the yak executable")
+    if external_yak:
+        try:
+            yak_cmd = _get_yak_command(ctx)
+        except ValueError:
+            raise invoke.Exit("Failed to download the yak executable")
 
     with chdir(target_dir):
-        try:
-            # not using `ctx.run()` here to get properly formatted output (unicode+colors)
-            subprocess.run(yak_cmd + ["build", "--platform", "any"], check=True)
-        except (OSError, subprocess.CalledProcessError) as e:
-            raise invoke.Exit(f"Failed to build the yak package: {e}")
-        if not any([f.endswith(".yak") for f in os.listdir(target_dir)]):
-            raise invoke.Exit("No .yak file was created in the build directory.")
+        if external_yak:
+            try:
+                # not using `ctx.run()` here to get properly formatted output (unicode+colors)
+                subprocess.run(yak_cmd + ["build", "--platform", "any"], check=True)
+            except (OSError, subprocess.CalledProcessError) as e:
+                raise invoke.Exit(f"Failed to build the yak package: {e}")
+            if not any([f.endswith(".yak") for f in os.listdir(target_dir)]):
+                raise invoke.Exit("No .yak file was created in the build directory.")
+        else:
+            _pack_yak(target_dir)
 
         # filename is what tells YAK the target Rhino version..?
-        taget_file = next((f for f in os.listdir(target_dir) if f.endswith(".yak")))
-        new_filename = taget_file.replace("any-any", f"{target_rhino}-any")
-        os.rename(taget_file, new_filename)
+        return next((f for f in os.listdir(target_dir) if f.endswith(".yak")))
+
+
+def _resolve_yak_files(yak_file: str) -> List[str]:
+    """Return the absolute paths of the ``.yak`` files matching comma-separated paths or glob patterns."""
+    files = []
+    for pattern in (p.strip() for p in yak_file.split(",")):
+        if not pattern:
+            continue
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            raise invoke.Exit(f"No yak files found matching {pattern}.")
+        for path in matches:
+            if not os.path.isfile(path):
+                raise invoke.Exit(f"Yak file not found at {path}. Please provide a valid path.")
+            if not path.endswith(".yak"):
+                raise invoke.Exit(f"Invalid file type of {path}. Must be a .yak file.")
+            files.append(os.path.abspath(path))
+    return list(dict.fromkeys(files))
+
+
+def _push_yak(cmd: List[str], retries: int):
+    """Push a package, retrying transient failures with exponential backoff.
+
+    Returns the number of attempts and the output of the last failed attempt, if any.
+    """
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(YAK_PUBLISH_BACKOFF * 2 ** (attempt - 1))
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        except OSError as e:
+            return attempt + 1, str(e)
+        if result.returncode == 0:
+            return attempt + 1, None
+
+        output = (result.stdout + result.stderr).strip() or f"exit code {result.returncode}"
+        if YAK_PERMANENT_ERRORS.search(output):
+            break
+    return attempt + 1, output
 
 
 @invoke.task(
-    help={"yak_file": "Path to the .yak file to publish.", "test_server": "True to publish to the test server."}
+    help={
+        "yak_file": "Comma-separated paths or glob patterns of the .yak files to publish, e.g. `dist/*/*.yak`.",
+        "test_server": "True to publish to the test server.",
+        "jobs": "(Optional) Maximum number of packages pushed concurrently. Defaults to the `yak.jobs` setting or 4.",
+        "retries": "(Optional) Number of retries of transient failures. Defaults to the `yak.retries` setting or 3.",
+    }
 )
-def publish_yak(ctx, yak_file: str, test_server: bool = False):
-    """Publish a YAK package to the YAK server."""
+def publish_yak(ctx, yak_file: str, test_server: bool = False, jobs: int = None, retries: int = None):
+    """Publish YAK packages to the YAK server.
 
-    if not os.path.exists(yak_file) or not os.path.isfile(yak_file):
-        raise invoke.Exit(f"Yak file not found at {yak_file}. Please provide a valid path.")
-    if not yak_file.endswith(".yak"):
-        raise invoke.Exit("Invalid file type. Must be a .yak file.")
+    The yak command is resolved once (it can be set with the ``yak.command`` setting) and the
+    packages are pushed concurrently. Failures are retried with exponential backoff, except
+    the ones that cannot succeed on retry (e.g. a version that was already published).
 
-    yak_file = os.path.abspath(yak_file)
+    """
+    settings = ctx.get("yak") or {}
+    files = _resolve_yak_files(yak_file)
+    jobs = int(jobs or settings.get("jobs") or 4)
+    retries = int(retries if retries is not None else settings.get("retries", 3))
 
     with chdir(ctx.base_folder):
-        with tempfile.TemporaryDirectory("actions.publish_yak") as action_dir:
+        yak_cmd = settings.get("command")
+        if isinstance(yak_cmd, str):
+            yak_cmd = shlex.split(yak_cmd)
+        if not yak_cmd:
             try:
-                yak_cmd = _get_yak_command(action_dir)
+                yak_cmd = _get_yak_command(ctx)
             except ValueError:
                 raise invoke.Exit("Failed to download the yak executable")
 
-            cmd = yak_cmd + ["push"]
-            if test_server:
-                cmd += ["--source", "https://test.yak.rhino3d.com"]
-            cmd.append(yak_file)
+        cmd = list(yak_cmd) + ["push"]
+        if test_server:
+            cmd += ["--source", "https://test.yak.rhino3d.com"]
 
-            try:
-                subprocess.run(cmd, check=True)
-            except (OSError, subprocess.CalledProcessError) as e:
-                raise invoke.Exit(f"Failed to publish the yak package: {e}")
+        print(f"Publishing {len(files)} package(s)...")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(jobs, len(files)))) as executor:
+            results = list(executor.map(lambda f: _push_yak(cmd + [f], retries), files))
+
+    failed = 0
+    for path, (attempts, error) in zip(files, results):
+        tries = f" after {attempts} attempts" if attempts > 1 else ""
+        if error:
+            failed += 1
+            print(f"❌ {os.path.basename(path)}{tries}: {error.splitlines()[-1]}")
+        else:
+            print(f"✅ {os.path.basename(path)}{tries}")
+
+    if failed:
+        raise invoke.Exit(f"Failed to publish {failed} of {len(files)} yak package(s).")
 
 
 def _is_header_line(line: str) -> bool:
     return re.match(r"^#\s+(r|venv|env):", line) is not None
 
 
+def _update_header(file: Path, header: List[str]):
+    """Replace the header of a component's code file, leaving it untouched if it is already up to date.
+
+    Returns whether the file was changed and the error raised while updating it, if any.
+    """
+    try:
+        with open(file, "r", encoding="utf-8", newline="") as f:
+            original_content = f.read()
+
+        lines = original_content.splitlines(keepends=True)
+        newline = "\r\n" if lines and lines[0].endswith("\r\n") else "\n"
+        content = "".join(line.replace("\n", newline) for line in header)
+        content += "".join(line for line in lines if not _is_header_line(line))
+        if content == original_content:
+            return False, None
+
+        atomic_write(str(file), content, mode=os.stat(file).st_mode & 0o777)
+        return True, None
+    except Exception as e:
+        return False, e
+
+
 @invoke.task(
     help={
         "version": "New minimum version to set in the header. If not provided, current version is used.",
@@ -341,13 +582,17 @@ def _is_header_line(line: str) -> bool:
     }
 )
 def update_gh_header(ctx, version: str = None, venv: str = None, dev: bool = False, envs: str = None):
-    """Update the minimum version header of all CPython Grasshopper components."""
-    toml_filepath = os.path.join(ctx.base_folder, "pyproject.toml")
+    """Update the minimum version header of all CPython Grasshopper components.
+
+    Files whose header is already up to date are left untouched, the others are rewritten atomically.
+
+    """
+    project = load_project(ctx.base_folder)
 
     new_header = []
     if not dev:
-        version = version or _get_version_from_toml(toml_filepath)
-        package_name = _get_package_name(toml_filepath)
+        version = version or project.version
+        package_name = project.name
         new_header.append(f"# r: {package_name}>={version}\n")
     if venv:
         new_header.append(f"# venv: {venv}\n")
@@ -356,21 +601,18 @@ def update_gh_header(ctx, version: str = None, venv: str = None, dev: bool = Fal
             new_header.append(f"# env: {env.strip()}\n")
     if dev:
         new_header.append(f"# env: {os.path.join(ctx.base_folder, 'src')}\n")
-        dependencies = _get_dependencies(ctx.base_folder)
+        dependencies = [_sanitize_dependency(dep) for dep in project.dependencies]
         if dependencies:
             new_header.append(f"# r: {', '.join(dependencies)}\n")
 
-    for file in Path(ctx.ghuser_cpython.source_dir).glob("**/code.py"):
-        try:
-            with open(file, "r", encoding="utf-8") as f:
-                original_content = f.readlines()
-
-            with open(file, "w", encoding="utf-8") as f:
-                for line in new_header:
-                    f.write(line)
-                for line in original_content:
-                    if not _is_header_line(line):
-                        f.write(line)
-            print(f"✅ Updated: {file}")
-        except Exception as e:
-            print(f"❌ Failed to update {file}: {e}")
+    files = sorted(Path(ctx.ghuser_cpython.source_dir).glob("**/code.py"))
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        results = list(executor.map(lambda file: _update_header(file, new_header), files))
+
+    failed = [(file, e) for file, (_, e) in zip(files, results) if e]
+    for file, e in failed:
+        print(f"❌ Failed to update {file}: {e}")
+
+    updated = sum(1 for changed, _ in results if changed)
+    unchanged = len(results) - updated - len(failed)
+    print(f"✅ Updated: {updated}, unchanged: {unchanged}, failed: {len(failed)}")
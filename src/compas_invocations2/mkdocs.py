@@ -1,68 +1,207 @@
 import json
+import subprocess
 
 import invoke
-import semver
 
 from compas_invocations2.console import chdir
+from compas_invocations2.fingerprint import fingerprinted
+from compas_invocations2.fingerprint import invalidate
+
+# Inputs of the mkdocs build, relative to `base_folder`. Overridden with the `mkdocs.inputs` setting.
+MKDOCS_INPUTS = ["mkdocs.yml", "docs/**/*", "src/**/*.py"]
+
+
+def _mkdocs_inputs(ctx, **kwargs):
+    return (ctx.get("mkdocs") or {}).get("inputs") or MKDOCS_INPUTS
+
+
+@fingerprinted(inputs=[_mkdocs_inputs], outputs=["dist/docs/**/*"], args=[], name="mkdocs.docs", store=True)
+def _build_site(ctx, flags):
+    ctx.run("mkdocs build {} -d dist/docs".format(flags))
 
 
 @invoke.task(
     help={
         "clean": "True to clean the site directory before building, otherwise False.",
         "verbose": "True to nicely format the output, otherwise False.",
+        "dirty": "True to only rebuild the pages whose sources changed, for fast local iteration, otherwise False.",
     }
 )
-def docs(ctx, clean=False, verbose=False):
-    """Builds the HTML documentation based on mkdocs."""
+def docs(ctx, clean=False, verbose=False, dirty=False):
+    """Builds the HTML documentation based on mkdocs.
+
+    The build is skipped when none of its inputs (``mkdocs.inputs``, defaults to
+    ``MKDOCS_INPUTS``) changed since the last successful build. Use ``--clean`` to
+    always rebuild, and ``--dirty`` to only rebuild the changed pages while editing.
+
+    """
+    if clean and dirty:
+        raise invoke.Exit("The --clean and --dirty options cannot be used together.")
+
     clean_flag = "--clean" if clean else ""
+    dirty_flag = "--dirty" if dirty else ""
     verbose_flag = "--verbose" if verbose else ""
+    flags = " ".join(f for f in (clean_flag, dirty_flag, verbose_flag) if f)
 
     with chdir(ctx.base_folder):
-        ctx.run("mkdocs build {} {} -d dist/docs".format(clean_flag, verbose_flag))
+        if dirty:
+            ctx.run("mkdocs build {} -d dist/docs".format(flags))
+            # dirty builds do not update the navigation of unchanged pages, the next regular build must not be skipped
+            invalidate(ctx, "mkdocs.docs")
+        else:
+            _build_site(ctx, flags, force=clean)
+
+
+def _select_versions(entries, keep_minors=None, drop_prereleases=False):
+    """Split deployed versions into the ones to keep and the ones to delete.
+
+    The latest patch of every minor version is kept. Versions that are not valid
+    semantic versions or that have aliases (e.g. ``latest``) are never deleted.
+
+    Parameters
+    ----------
+    entries : list of dict
+        The entries of mike's ``versions.json``.
+    keep_minors : int, optional
+        If given, only keep the latest patch of this many of the newest minor versions.
+    drop_prereleases : bool
+        True to delete all pre-release versions, otherwise False.
+
+    Returns
+    -------
+    tuple of list of str
+        The versions to keep and the versions to delete.
+    """
+    import semver
+
+    protected = set()
+    candidates = {}
+    for entry in entries:
+        try:
+            version = semver.Version.parse(entry["version"])
+        except ValueError:
+            protected.add(entry["version"])
+            continue
+        if entry.get("aliases"):
+            protected.add(entry["version"])
+        candidates[entry["version"]] = version
+
+    # latest[(major, minor)] = highest version in that minor
+    latest = {}
+    for name, version in candidates.items():
+        if drop_prereleases and version.prerelease:
+            continue
+        key = (version.major, version.minor)
+        if key not in latest or version > candidates[latest[key]]:
+            latest[key] = name
+
+    minors = sorted(latest, reverse=True)
+    if keep_minors is not None:
+        minors = minors[:keep_minors]
+
+    to_keep = protected | set(latest[key] for key in minors)
+    to_delete = [name for name in candidates if name not in to_keep]
+    return sorted(to_keep), sorted(to_delete)
+
+
+def _git_with_input(args, data):
+    """Run a git command in the current directory with ``data`` as stdin and return its stripped output."""
+    # not using `ctx.run(..., in_stream=...)`, which feeds stdin byte by byte and is very slow for large inputs
+    try:
+        result = subprocess.run(["git"] + args, input=data, capture_output=True, text=True, check=True)
+    except subprocess.CalledProcessError as e:
+        raise invoke.Exit("`git {}` failed:\n{}".format(" ".join(args), e.stderr))
+    return result.stdout.strip()
+
+
+def _delete_versions(ctx, parent, entries, to_delete, message):
+    """Remove versions from a mike branch in a single commit, without checking it out.
+
+    Only the top-level tree of the branch is rewritten: the folders of the deleted
+    versions are dropped and ``versions.json`` is replaced, so the cost does not
+    depend on the size of the deployed sites.
+
+    Returns
+    -------
+    str
+        The hash of the new commit.
+    """
+    remaining = [entry for entry in entries if entry["version"] not in to_delete]
+    versions_json = json.dumps(remaining, indent=2) + "\n"
+    blob = _git_with_input(["hash-object", "-w", "--stdin"], versions_json)
+
+    lines = []
+    for line in ctx.run('git ls-tree -z "{}"'.format(parent), hide=True).stdout.split("\0"):
+        if not line:
+            continue
+        info, name = line.split("\t", 1)
+        if name in to_delete:
+            continue
+        if name == "versions.json":
+            info = "100644 blob {}".format(blob)
+        lines.append("{}\t{}".format(info, name))
+
+    tree = _git_with_input(["mktree", "-z"], "\0".join(lines) + "\0")
+    return _git_with_input(["commit-tree", tree, "-p", parent, "-F", "-"], message)
 
 
 @invoke.task(
     help={
         "push": "True to push changes to the remote after pruning, otherwise False.",
         "dry": "True to print which versions would be deleted without actually deleting them.",
+        "keep_minors": "(Optional) Only keep the latest patch of this many of the newest minor versions.",
+        "drop_prereleases": "True to delete all pre-release versions, otherwise False.",
     }
 )
-def prune_docs(ctx, push=True, dry=False):
+def prune_docs(ctx, push=True, dry=False, keep_minors=None, drop_prereleases=False):
     """Prunes deployed doc versions, keeping only the latest patch per minor version.
 
-    Fetches the list of deployed versions via mike, groups them by major.minor,
-    and deletes any patch version that is not the highest in its group.
+    Reads the deployed versions from ``versions.json`` on mike's branch (``mike.branch``,
+    defaults to ``gh-pages``) and removes the pruned versions in a single commit, editing
+    the branch with git plumbing commands instead of checking it out. Versions with
+    aliases are never deleted.
 
     """
-    result = ctx.run("mike list --json", hide=True)
-    entries = json.loads(result.stdout)
+    settings = ctx.get("mike") or {}
+    branch = settings.get("branch") or "gh-pages"
+    remote = settings.get("remote") or "origin"
 
-    # latest[(major, minor)] = semver.Version — overwritten whenever a higher patch is seen
-    latest = {}
-    all_semver = []
-    for entry in entries:
-        ver_str = entry["version"]
-        try:
-            v = semver.Version.parse(ver_str)
-        except ValueError:
-            continue
-        all_semver.append(ver_str)
-        key = (v.major, v.minor)
-        if key not in latest or v.compare(latest[key]) > 0:
-            latest[key] = v
-
-    to_keep = [str(v) for v in latest.values()]
-    to_delete = [v for v in all_semver if v not in to_keep]
-
-    if dry:
-        print("Keep:   {}".format(", ".join(sorted(to_keep)) or "(none)"))
-        print("Delete: {}".format(", ".join(sorted(to_delete)) or "(none)"))
-        return
-
-    if not to_delete:
-        print("No old patch versions to prune.")
-        return
-
-    push_flag = "-p" if push else ""
-    ctx.run(f"mike delete {push_flag} {' '.join(to_delete)}".strip())
-    print(f"Deleted: {', '.join(to_delete)}")
+    with chdir(ctx.base_folder):
+        # like mike, start from the remote branch if there is no local one
+        local = ctx.run('git rev-parse --verify -q "refs/heads/{}"'.format(branch), hide=True, warn=True)
+        tracking = ctx.run(
+            'git rev-parse --verify -q "refs/remotes/{}/{}"'.format(remote, branch), hide=True, warn=True
+        )
+        if local.ok:
+            ref, parent, old = "refs/heads/{}".format(branch), local.stdout.strip(), local.stdout.strip()
+        elif tracking.ok:
+            ref, parent, old = "refs/remotes/{}/{}".format(remote, branch), tracking.stdout.strip(), "0" * 40
+        else:
+            raise invoke.Exit("Branch `{}` not found, nothing to prune.".format(branch))
+
+        result = ctx.run('git show "{}:versions.json"'.format(ref), hide=True, warn=True)
+        if not result.ok:
+            raise invoke.Exit("No versions.json found on branch `{}`.".format(branch))
+        entries = json.loads(result.stdout)
+
+        keep_minors = int(keep_minors) if keep_minors is not None else None
+        to_keep, to_delete = _select_versions(entries, keep_minors, drop_prereleases)
+
+        if dry:
+            print("Keep:   {}".format(", ".join(to_keep) or "(none)"))
+            print("Delete: {}".format(", ".join(to_delete) or "(none)"))
+            return
+
+        if not to_delete:
+            print("No old versions to prune.")
+            return
+
+        message = "Removed {}".format(", ".join(to_delete))
+        commit = _delete_versions(ctx, parent, entries, set(to_delete), message)
+        # compare-and-swap, so that concurrent deployments are not overwritten
+        ctx.run('git update-ref -m "{}" "refs/heads/{}" {} {}'.format(message, branch, commit, old), hide=True)
+
+        if push:
+            ctx.run('git push {} "refs/heads/{}:refs/heads/{}"'.format(remote, branch, branch))
+
+    print("Deleted: {}".format(", ".join(to_delete)))
@@ -0,0 +1,117 @@
+import os
+import sys
+
+import invoke
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    import tomli as tomllib
+
+
+class ProjectMetadata:
+    """Read-only view of the metadata declared in a project's ``pyproject.toml``.
+
+    Use :func:`load_project` to get an instance, which is shared by all tasks as long
+    as the file does not change.
+
+    Parameters
+    ----------
+    base_folder : str
+        Folder containing the ``pyproject.toml``.
+    data : dict
+        The parsed content of the ``pyproject.toml``.
+    """
+
+    def __init__(self, base_folder, data):
+        self.base_folder = base_folder
+        self.data = data
+        self._dependencies = None
+
+    @property
+    def name(self):
+        """str: The name of the package, from the ``[project]`` table."""
+        name = self.data.get("project", {}).get("name")
+        if not name:
+            raise invoke.Exit("Failed to get package name. Is your pyproject.toml missing a '[project]' section?")
+        return name
+
+    @property
+    def version(self):
+        """str: The current version, from the ``[tool.bumpversion]`` table."""
+        version = self.data.get("tool", {}).get("bumpversion", {}).get("current_version")
+        if not version:
+            raise invoke.Exit("Failed to get version from pyproject.toml. Please provide a version number.")
+        return version
+
+    @property
+    def dependencies(self):
+        """list of str: The requirements of the package.
+
+        Static ``[project] dependencies`` are returned as-is, dynamic ones are read from
+        the requirements file configured for setuptools, skipping comments and blank lines.
+        """
+        if self._dependencies is None:
+            self._dependencies = self._resolve_dependencies()
+        return self._dependencies
+
+    def _resolve_dependencies(self):
+        dependencies = self.data.get("project", {}).get("dependencies")
+        if dependencies:
+            return list(dependencies)
+
+        dynamic_deps = self.data.get("tool", {}).get("setuptools", {}).get("dynamic", {}).get("dependencies")
+        if not dynamic_deps or "file" not in dynamic_deps:
+            return []
+
+        files = dynamic_deps["file"]
+        if isinstance(files, str):
+            files = [files]
+
+        requirements = []
+        for filename in files:
+            with open(os.path.join(self.base_folder, filename), "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        requirements.append(line)
+        return requirements
+
+
+# Loaded projects, keyed by path of the pyproject.toml: (mtime, size, ProjectMetadata)
+_PROJECTS = {}
+
+
+def load_project(base_folder):
+    """Return the metadata of the project in ``base_folder``.
+
+    The ``pyproject.toml`` is parsed with the fast, read-only ``tomllib`` and the
+    result is cached until the file's modification time or size changes.
+
+    Parameters
+    ----------
+    base_folder : str
+        Folder containing the ``pyproject.toml``.
+
+    Returns
+    -------
+    :class:`ProjectMetadata`
+    """
+    path = os.path.abspath(os.path.join(base_folder, "pyproject.toml"))
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise invoke.Exit("Failed to load pyproject.toml. No such file: {}".format(path))
+
+    cached = _PROJECTS.get(path)
+    if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+        return cached[2]
+
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+    if not data:
+        raise invoke.Exit("Failed to load pyproject.toml.")
+
+    project = ProjectMetadata(os.path.dirname(path), data)
+    _PROJECTS[path] = (stat.st_mtime_ns, stat.st_size, project)
+    return project
@@ -0,0 +1,27 @@
+"""Pytest plugin recording the duration of every test, loaded by ``invoke test``.
+
+It is loaded with ``-p compas_invocations2.pytest_durations`` and writes the total
+duration (setup, call and teardown) of every test, by node id, as JSON to the file
+named by the ``COMPAS_INVOCATIONS_DURATIONS`` environment variable. Unlike a JUnit XML
+report, it does not interfere with the reporting options of the project.
+"""
+
+import json
+import os
+
+ENV_VAR = "COMPAS_INVOCATIONS_DURATIONS"
+
+_DURATIONS = {}
+
+
+def pytest_runtest_logreport(report):
+    _DURATIONS[report.nodeid] = _DURATIONS.get(report.nodeid, 0.0) + report.duration
+
+
+def pytest_sessionfinish(session):
+    path = os.environ.get(ENV_VAR)
+    # only the controller process writes the file when tests run on several workers (pytest-xdist)
+    if not path or hasattr(session.config, "workerinput"):
+        return
+    with open(path, "w") as f:
+        json.dump(_DURATIONS, f)
@@ -1,31 +1,161 @@
+import concurrent.futures
+import os
+import time
+
 import invoke
 
 from compas_invocations2.console import chdir
+from compas_invocations2.docs import _linkcheck
+from compas_invocations2.git import changed_files
+
+
+def _docs_links(ctx):
+    """Check the links of the already built docs (see `invoke docs`), without building them."""
+    messages = []
+    try:
+        _linkcheck(ctx, log=messages.append)
+    except invoke.Exit as e:
+        messages.append(e.message)
+        return False, "\n".join(messages)
+    return True, "\n".join(messages)
+
+
+# Read-only checkers available to `check`, by name. Commands run from `base_folder`, callables
+# are called in-process with the invoke context and return whether they passed and their output.
+CHECKERS = {
+    "lint": "ruff check {lint_folders}",
+    "format": "ruff format --check {format_folders}",
+    "doctest": "pytest --doctest-modules",
+    "docs-links": _docs_links,
+}
+
+DEFAULT_CHECKERS = ["lint", "format"]
 
 
-@invoke.task()
-def lint(ctx):
+def _ruff_targets(ctx, folders, changed):
+    """Return the paths to pass to ruff: the configured folders, or only the changed python files in them."""
+    if not changed:
+        return folders
+
+    ref = "HEAD" if changed is True else changed
+    folders = [os.path.normpath(os.path.abspath(folder)) for folder in folders]
+    return [
+        f
+        for f in changed_files(ctx, ref)
+        if f.endswith((".py", ".pyi")) and os.path.isfile(f) and _is_inside(os.path.abspath(f), folders)
+    ]
+
+
+def _is_inside(path, folders):
+    """Return True if ``path`` is one of ``folders`` (e.g. a single file like ``tasks.py``) or inside one of them."""
+    for folder in folders:
+        try:
+            if os.path.commonpath([path, folder]) == folder:
+                return True
+        except ValueError:
+            # on different drives
+            continue
+    return False
+
+
+@invoke.task(
+    optional=["changed"],
+    help={
+        "changed": "(Optional) Only lint the files modified or staged compared to a git ref (defaults to HEAD).",
+    },
+)
+def lint(ctx, changed=None):
     """Check the consistency of coding style."""
 
-    print("\nRunning ruff linter...")
-    ctx.run("ruff check --fix src tests")
+    with chdir(ctx.base_folder):
+        targets = _ruff_targets(ctx, ctx.get("lint_folders") or ["src", "tests"], changed)
+        if not targets:
+            print("\nNo changed files to lint.")
+            return
+
+        print("\nRunning ruff linter...")
+        ctx.run("ruff check --fix {}".format(" ".join('"{}"'.format(t) for t in targets)))
 
     print("\nAll linting is done!")
 
 
-@invoke.task()
-def format(ctx):
+@invoke.task(
+    optional=["changed"],
+    help={
+        "changed": "(Optional) Only format the files modified or staged compared to a git ref (defaults to HEAD).",
+    },
+)
+def format(ctx, changed=None):
     """Reformat the code base using black."""
 
-    print("\nRunning ruff formatter...")
-    ctx.run("ruff format src tests")
+    with chdir(ctx.base_folder):
+        targets = _ruff_targets(ctx, ctx.get("format_folders") or ["src", "tests"], changed)
+        if not targets:
+            print("\nNo changed files to format.")
+            return
+
+        print("\nRunning ruff formatter...")
+        ctx.run("ruff format {}".format(" ".join('"{}"'.format(t) for t in targets)))
 
     print("\nAll formatting is done!")
 
 
-@invoke.task()
-def check(ctx):
-    """Check the consistency of documentation, coding style and a few other things."""
+def _run_checker(ctx, command):
+    start = time.perf_counter()
+    if callable(command):
+        ok, output = command(ctx)
+    else:
+        result = ctx.run(command, hide=True, warn=True, in_stream=False)
+        ok, output = result.ok, result.stdout + result.stderr
+    return ok, output.strip(), time.perf_counter() - start
+
+
+@invoke.task(
+    help={
+        "checkers": "(Optional) Comma-separated names of the checkers to run, e.g. `lint,format,doctest`.",
+    }
+)
+def check(ctx, checkers=None):
+    """Check the consistency of documentation, coding style and a few other things.
+
+    The checkers run concurrently as read-only subprocesses. Their output is buffered
+    and printed in a fixed order, and the task fails if any of them fails. Checkers are
+    selected with the ``check.checkers`` setting (defaults to ``DEFAULT_CHECKERS``),
+    and new ones can be defined in ``check.commands``, a mapping of names to commands.
+
+    """
+    settings = ctx.get("check") or {}
+    commands = dict(CHECKERS, **(settings.get("commands") or {}))
+    names = checkers.split(",") if checkers else list(settings.get("checkers") or DEFAULT_CHECKERS)
+    names = [name.strip() for name in names if name.strip()]
+
+    unknown = [name for name in names if name not in commands]
+    if unknown:
+        raise invoke.Exit("Unknown checker(s): {}. Available: {}.".format(", ".join(unknown), ", ".join(commands)))
+
+    folders = {
+        "lint_folders": " ".join('"{}"'.format(f) for f in ctx.get("lint_folders") or ["src", "tests"]),
+        "format_folders": " ".join('"{}"'.format(f) for f in ctx.get("format_folders") or ["src", "tests"]),
+    }
 
     with chdir(ctx.base_folder):
-        lint(ctx)
+        print("\nRunning {}...".format(", ".join(names)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(names), 1)) as executor:
+            futures = [
+                executor.submit(_run_checker, ctx, command if callable(command) else command.format(**folders))
+                for command in (commands[name] for name in names)
+            ]
+
+    failed = []
+    for name, future in zip(names, futures):
+        ok, output, elapsed = future.result()
+        print("\n{} {} ({:.1f}s)".format("✅" if ok else "❌", name, elapsed))
+        if output:
+            print(output)
+        if not ok:
+            failed.append(name)
+
+    if failed:
+        raise invoke.Exit("\nChecks failed: {}".format(", ".join(failed)), code=1)
+
+    print("\nAll checks passed!")
@@ -1,16 +1,316 @@
+import ast
+import fnmatch
+import glob
+import os
+import tempfile
+import time
+
 import invoke
 
+from compas_invocations2 import pytest_durations
+from compas_invocations2.cache import cache_key
+from compas_invocations2.cache import file_digest
+from compas_invocations2.cache import get_cache_dir
+from compas_invocations2.cache import read_json
+from compas_invocations2.cache import write_json
 from compas_invocations2.console import chdir
+from compas_invocations2.git import changed_files
 
+# Folders scanned to build the import graph used by `test --changed-since`.
+IMPORT_GRAPH_FOLDERS = ["src", "tests"]
 
-@invoke.task()
-def test(ctx, doctest=False):
-    """Run all tests."""
-    with chdir(ctx.base_folder):
-        if doctest:
-            ctx.run("pytest --doctest-modules")
+# Changes to any of these files may affect every test, so the full suite is run instead.
+FULL_SUITE_TRIGGERS = [
+    "conftest.py",
+    "pyproject.toml",
+    "setup.py",
+    "setup.cfg",
+    "pytest.ini",
+    "tox.ini",
+    "requirements*.txt",
+]
+
+
+def _is_test_file(path):
+    name = os.path.basename(path)
+    return path.startswith("tests/") and (fnmatch.fnmatch(name, "test_*.py") or fnmatch.fnmatch(name, "*_test.py"))
+
+
+def _module_names(path):
+    """Return the names under which a python file can be imported.
+
+    Files of a ``src`` layout are importable without the ``src`` prefix, and test
+    helpers both with and without the name of the ``tests`` folder.
+    """
+    parts = path[: -len(".py")].split("/")
+    if parts[-1] == "__init__":
+        parts = parts[:-1]
+    if parts[0] == "src":
+        return [".".join(parts[1:])]
+    return [name for name in (".".join(parts), ".".join(parts[1:])) if name]
+
+
+def _parse_imports(path, module):
+    """Return the names of all modules imported by a python file, resolving relative imports."""
+    with open(path, "rb") as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    package = module if os.path.basename(path) == "__init__.py" else module.rpartition(".")[0]
+    imports = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                parent = package.split(".")[: len(package.split(".")) - node.level + 1] if package else []
+                base = ".".join(p for p in parent + [base] if p)
+            imports.add(base)
+            imports.update("{}.{}".format(base, alias.name) for alias in node.names)
+    return sorted(i for i in imports if i)
+
+
+def _import_graph(ctx, folders=IMPORT_GRAPH_FOLDERS):
+    """Return a mapping of every python file under ``folders`` to the files it imports.
+
+    The imports of each file are cached on disk, keyed by the hash of its content,
+    so only files that changed since the last run are parsed again.
+
+    Returns
+    -------
+    tuple of dict
+        The files imported by every file, and the names of the modules it imports.
+    """
+    cache_path = os.path.join(get_cache_dir("test-impact", ctx=ctx), cache_key(os.path.abspath(".")) + ".json")
+    cache = read_json(cache_path, {})
+
+    files = []
+    for folder in folders:
+        for root, dirs, filenames in os.walk(folder):
+            dirs[:] = [d for d in dirs if not d.startswith(".") and d != "__pycache__"]
+            files.extend(os.path.join(root, f).replace(os.sep, "/") for f in filenames if f.endswith(".py"))
+
+    modules = {}
+    for path in files:
+        for name in _module_names(path):
+            modules.setdefault(name, path)
+
+    imports = {}
+    names_by_path = {}
+    updated = {}
+    for path in files:
+        digest = file_digest(path)
+        cached = cache.get(path)
+        if cached and cached[0] == digest:
+            names = cached[1]
         else:
-            ctx.run("pytest")
+            try:
+                names = _parse_imports(path, _module_names(path)[0])
+            except (SyntaxError, ValueError):
+                names = []
+        updated[path] = [digest, names]
+        names_by_path[path] = names
+
+        # importing `a.b.c` also runs `a/__init__.py` and `a/b/__init__.py`
+        imports[path] = set()
+        for name in names:
+            parts = name.split(".")
+            for i in range(1, len(parts) + 1):
+                target = modules.get(".".join(parts[:i]))
+                if target and target != path:
+                    imports[path].add(target)
+
+    if updated != cache:
+        write_json(cache_path, updated)
+    return imports, names_by_path
+
+
+def _select_tests(ctx, ref):
+    """Return the test files affected by the changes since ``ref``, or None to run the full suite."""
+    changed = changed_files(ctx, ref)
+
+    for path in changed:
+        if any(fnmatch.fnmatch(os.path.basename(path), pattern) for pattern in FULL_SUITE_TRIGGERS):
+            print("{} changed, running the full test suite.".format(path))
+            return None
+        in_graph = any(path.startswith(folder + "/") for folder in IMPORT_GRAPH_FOLDERS)
+        if in_graph and not path.endswith(".py"):
+            print("{} changed, running the full test suite.".format(path))
+            return None
+
+    imports, names_by_path = _import_graph(ctx)
+    importers = {}
+    for path, targets in imports.items():
+        for target in targets:
+            importers.setdefault(target, set()).add(path)
+
+    affected = set(p for p in changed if p in imports)
+
+    # deleted (or renamed) modules are not part of the graph anymore, the files that still import them are affected
+    deleted = set()
+    for path in changed:
+        in_graph = any(path.startswith(folder + "/") for folder in IMPORT_GRAPH_FOLDERS)
+        if in_graph and path.endswith(".py") and not os.path.exists(path):
+            deleted.update(_module_names(path))
+    for path, names in names_by_path.items():
+        if any(name == module or name.startswith(module + ".") for name in names for module in deleted):
+            affected.add(path)
+    pending = list(affected)
+    while pending:
+        for importer in importers.get(pending.pop(), ()):
+            if importer not in affected:
+                affected.add(importer)
+                pending.append(importer)
+
+    return sorted(p for p in affected if _is_test_file(p))
+
+
+def _durations_path(ctx):
+    """Return the path of the test durations history.
+
+    It is set with the ``tests.durations_file`` setting (relative to ``base_folder``, e.g. to
+    keep it in a CI cache) and defaults to a file of the user-level cache.
+    """
+    path = (ctx.get("tests") or {}).get("durations_file")
+    if path:
+        return os.path.join(ctx.base_folder, path)
+    return os.path.join(
+        get_cache_dir("test-durations", ctx=ctx), cache_key(os.path.abspath(ctx.base_folder)) + ".json"
+    )
+
+
+def _record_durations(durations_path, history_path):
+    """Add the per-test durations written by the ``pytest_durations`` plugin to the history file."""
+    durations = read_json(durations_path)
+    if not durations:
+        return
+
+    history = read_json(history_path, {})
+    now = time.time()
+    for nodeid, duration in durations.items():
+        history[nodeid] = [duration, now]
+    write_json(history_path, history)
+
+
+def _merge_durations(histories):
+    """Merge several durations histories, keeping the most recent measurement of every test."""
+    merged = {}
+    for history in histories:
+        for key, (duration, recorded) in history.items():
+            if key not in merged or merged[key][1] < recorded:
+                merged[key] = [duration, recorded]
+    return merged
+
+
+def _shard_files(files, history, index, count):
+    """Return the test files of shard ``index`` (0-based) out of ``count``.
+
+    Files with known durations are assigned, longest first, to the shard with the least
+    total duration so far; files without history are distributed round-robin.
+    """
+    durations = {}
+    for key, (duration, _) in history.items():
+        path = key.split("::")[0]
+        durations[path] = durations.get(path, 0.0) + duration
+
+    shards = [[] for _ in range(count)]
+    loads = [0.0] * count
+    for path in sorted((f for f in files if f in durations), key=lambda f: (-durations[f], f)):
+        lightest = min(range(count), key=lambda i: (loads[i], i))
+        shards[lightest].append(path)
+        loads[lightest] += durations[path]
+
+    for i, path in enumerate(sorted(f for f in files if f not in durations)):
+        shards[i % count].append(path)
+
+    return sorted(shards[index])
+
+
+def _parse_shard(shard):
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        index, count = 0, 0
+    if not 1 <= index <= count:
+        raise invoke.Exit("Invalid shard `{}`. Must be `i/N`, with 1 <= i <= N.".format(shard))
+    return index - 1, count
+
+
+def _collect_test_files(folder="tests"):
+    files = []
+    for root, dirs, filenames in os.walk(folder):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d != "__pycache__"]
+        files.extend(os.path.join(root, f).replace(os.sep, "/") for f in filenames)
+    return sorted(f for f in files if _is_test_file(f))
+
+
+@invoke.task(
+    help={
+        "doctest": "True to also run the doctests of the modules, otherwise False.",
+        "changed_since": "(Optional) Only run the tests that (transitively) import files changed since this git ref.",
+        "shard": "(Optional) Only run shard `i/N` of the test files, balanced by the recorded test durations.",
+    }
+)
+def test(ctx, doctest=False, changed_since=None, shard=None):
+    """Run all tests.
+
+    The duration of every test is recorded in a history file (``tests.durations_file``,
+    defaults to the user-level cache), which is used to balance the shards.
+
+    """
+    with chdir(ctx.base_folder):
+        cmd = "pytest --doctest-modules" if doctest else "pytest"
+        history_path = _durations_path(ctx)
+
+        selected = None
+        if changed_since:
+            selected = _select_tests(ctx, changed_since)
+            if selected == []:
+                print("No tests are affected by the changes since {}.".format(changed_since))
+                return
+            if selected is not None:
+                print("Running {} test file(s) affected by the changes since {}.".format(len(selected), changed_since))
+
+        if shard:
+            index, count = _parse_shard(shard)
+            files = selected if selected is not None else _collect_test_files()
+            selected = _shard_files(files, read_json(history_path, {}), index, count)
+            if not selected:
+                print("No tests in shard {}.".format(shard))
+                return
+            print("Running {} test file(s) in shard {}.".format(len(selected), shard))
+
+        if selected is not None:
+            cmd += " " + " ".join(selected)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            durations_path = os.path.join(tmp, "durations.json")
+            try:
+                ctx.run(
+                    "{} -p compas_invocations2.pytest_durations".format(cmd),
+                    env={pytest_durations.ENV_VAR: durations_path},
+                )
+            finally:
+                _record_durations(durations_path, history_path)
+
+
+@invoke.task(
+    help={
+        "files": "Comma-separated paths or glob patterns of durations histories to merge, e.g. from CI jobs.",
+    }
+)
+def merge_durations(ctx, files):
+    """Merge test durations histories into the local one, keeping the most recent measurement of every test."""
+    with chdir(ctx.base_folder):
+        paths = sorted(set(p for pattern in files.split(",") for p in glob.glob(pattern.strip())))
+        if not paths:
+            raise invoke.Exit("No durations histories found matching `{}`.".format(files))
+
+        history_path = _durations_path(ctx)
+        histories = [read_json(history_path, {})] + [read_json(path, {}) for path in paths]
+        merged = _merge_durations(histories)
+        write_json(history_path, merged)
+        print("Merged {} histories into {} ({} tests).".format(len(paths), history_path, len(merged)))
 
 
 @invoke.task()
@@ -0,0 +1,191 @@
+"""Opt-in timing instrumentation of tasks and the commands they run.
+
+Set the ``COMPAS_INVOCATIONS_TIMING`` environment variable to print a summary of the
+wall time of every task, ``ctx.run`` and ``subprocess.run`` call when invoke exits,
+and ``COMPAS_INVOCATIONS_TRACE`` to the path of a JSON file to additionally write
+a Chrome trace (viewable in ``chrome://tracing`` or https://ui.perfetto.dev).
+Alternatively, call :func:`install` from the project's ``tasks.py``.
+"""
+
+import atexit
+import contextlib
+import json
+import os
+import subprocess
+import threading
+import time
+
+import invoke
+
+_EVENTS = []
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+_ORIGIN = time.perf_counter()
+
+# original callables replaced by `install`, to be restored by `uninstall`
+_ORIGINALS = {}
+
+
+@contextlib.contextmanager
+def span(name, category="task"):
+    """Record the wall time of the enclosed block.
+
+    Spans opened inside other spans of the same thread are recorded as nested.
+
+    Parameters
+    ----------
+    name : str
+        Name of the span, e.g. the name of a task or a command.
+    category : str
+        Category of the span, e.g. ``"task"``, ``"run"`` or ``"subprocess"``.
+    """
+    depth = getattr(_LOCAL, "depth", 0)
+    _LOCAL.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        _LOCAL.depth = depth
+        with _LOCK:
+            _EVENTS.append((start, duration, name, category, threading.get_ident(), depth))
+
+
+def _command_name(args):
+    if isinstance(args, (list, tuple)):
+        return " ".join(str(arg) for arg in args)
+    return str(args)
+
+
+def install(trace_path=None, summary=True):
+    """Start recording the wall time of all tasks and the commands they run.
+
+    Parameters
+    ----------
+    trace_path : str, optional
+        If given, a Chrome trace of all recorded spans is written to this file at exit.
+    summary : bool
+        True to print a summary table of all recorded spans at exit, otherwise False.
+    """
+    if _ORIGINALS:
+        return
+
+    _ORIGINALS["task"] = invoke.Task.__call__
+    _ORIGINALS["run"] = invoke.Context.run
+    _ORIGINALS["subprocess"] = subprocess.run
+
+    def task_call(self, *args, **kwargs):
+        with span(self.name, "task"):
+            return _ORIGINALS["task"](self, *args, **kwargs)
+
+    def context_run(self, command, **kwargs):
+        with span(_command_name(command), "run"):
+            return _ORIGINALS["run"](self, command, **kwargs)
+
+    def subprocess_run(*args, **kwargs):
+        with span(_command_name(args[0] if args else kwargs.get("args")), "subprocess"):
+            return _ORIGINALS["subprocess"](*args, **kwargs)
+
+    invoke.Task.__call__ = task_call
+    invoke.Context.run = context_run
+    subprocess.run = subprocess_run
+
+    if summary:
+        atexit.register(print_summary)
+    if trace_path:
+        atexit.register(write_trace, trace_path)
+
+
+def uninstall():
+    """Stop recording and restore the original, uninstrumented functions."""
+    if not _ORIGINALS:
+        return
+
+    invoke.Task.__call__ = _ORIGINALS.pop("task")
+    invoke.Context.run = _ORIGINALS.pop("run")
+    subprocess.run = _ORIGINALS.pop("subprocess")
+    atexit.unregister(print_summary)
+    atexit.unregister(write_trace)
+
+
+def events():
+    """Return the recorded spans in chronological order.
+
+    Returns
+    -------
+    list of dict
+        Spans with ``name``, ``category``, ``start`` and ``duration`` (in seconds,
+        relative to the import of this module), ``thread`` and nesting ``depth``.
+    """
+    with _LOCK:
+        recorded = sorted(_EVENTS)
+    return [
+        {
+            "name": name,
+            "category": category,
+            "start": start - _ORIGIN,
+            "duration": duration,
+            "thread": thread,
+            "depth": depth,
+        }
+        for start, duration, name, category, thread, depth in recorded
+    ]
+
+
+def print_summary():
+    """Print a table of all recorded spans, indented by nesting level."""
+    recorded = events()
+    if not recorded:
+        return
+
+    print("\n{:<10} {:>10}  {}".format("Category", "Time (s)", "Name"))
+    for event in recorded:
+        name = "  " * event["depth"] + event["name"]
+        if len(name) > 80:
+            name = name[:77] + "..."
+        print("{:<10} {:>10.3f}  {}".format(event["category"], event["duration"], name))
+
+    print("{:<10} {:>10.3f}".format("Total", _wall_time(recorded)))
+
+
+def _wall_time(recorded):
+    """Return the wall time covered by the outermost spans.
+
+    Spans of worker threads are recorded at depth 0 too, so overlapping spans are
+    merged instead of summed, to not count the time spent in parallel twice.
+    """
+    total = 0.0
+    end = None
+    for event in recorded:
+        if event["depth"] != 0:
+            continue
+        start, stop = event["start"], event["start"] + event["duration"]
+        if end is None or start > end:
+            total += stop - start
+            end = stop
+        elif stop > end:
+            total += stop - end
+            end = stop
+    return total
+
+
+def write_trace(path):
+    """Write all recorded spans to ``path`` in the Chrome trace event format."""
+    pid = os.getpid()
+    trace = {
+        "displayTimeUnit": "ms",
+        "traceEvents": [
+            {
+                "name": event["name"],
+                "cat": event["category"],
+                "ph": "X",
+                "ts": round(event["start"] * 1e6),
+                "dur": round(event["duration"] * 1e6),
+                "pid": pid,
+                "tid": event["thread"],
+            }
+            for event in events()
+        ],
+    }
+    with open(path, "w") as f:
+        json.dump(trace, f)
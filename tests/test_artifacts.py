@@ -0,0 +1,114 @@
+import os
+import stat
+
+from invoke import Config
+from invoke import Context
+
+from compas_invocations2 import artifacts
+from compas_invocations2.cache import default_mode
+from compas_invocations2.fingerprint import fingerprinted
+
+
+def _context(root, store, **config):
+    overrides = {"base_folder": str(root), "cache_dir": str(root / ".cache"), "artifact_store": {"path": str(store)}}
+    overrides.update(config)
+    return Context(config=Config(overrides=overrides))
+
+
+def _checkout(root):
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "module.py").write_text("x = 1\n")
+    return root
+
+
+def test_publish_and_restore_across_checkouts(tmp_path):
+    store = tmp_path / "store"
+    first = _checkout(tmp_path / "first")
+    (first / "dist" / "sub").mkdir(parents=True)
+    (first / "dist" / "a.txt").write_text("a")
+    (first / "dist" / "sub" / "b.txt").write_text("b")
+
+    ctx = _context(first, store)
+    paths = [str(first / "dist" / "a.txt"), str(first / "dist" / "sub" / "b.txt"), str(tmp_path / "outside.txt")]
+    assert artifacts.publish(ctx, "key", paths)
+    assert not artifacts.publish(ctx, "key", paths)
+    assert os.listdir(str(store / "tmp")) == []
+    entry = store / "objects" / "ke" / "key"
+    assert stat.S_IMODE(entry.stat().st_mode) == default_mode(folder=True)
+    assert stat.S_IMODE((entry / artifacts.META).stat().st_mode) == default_mode()
+
+    second = _checkout(tmp_path / "second")
+    ctx = _context(second, store)
+    assert artifacts.restore(ctx, "key") == ["dist/a.txt", "dist/sub/b.txt"]
+    assert (second / "dist" / "sub" / "b.txt").read_text() == "b"
+    assert artifacts.restore(ctx, "missing") is None
+
+
+def test_evict_removes_least_recently_used_entries(tmp_path):
+    store = tmp_path / "store"
+    root = _checkout(tmp_path / "project")
+    (root / "dist").mkdir()
+    ctx = _context(root, store, artifact_store={"path": str(store), "max_size": "2K"})
+
+    for i, key in enumerate(["old", "used", "new"]):
+        (root / "dist" / "data.bin").write_bytes(b"x" * 1000)
+        artifacts.publish(ctx, key, [str(root / "dist" / "data.bin")])
+        os.utime(str(store / "objects" / key[:2] / key / artifacts.META), (i, i))
+        if key == "used":
+            assert artifacts.restore(ctx, "old")
+
+    assert artifacts.restore(ctx, "old")
+    assert artifacts.restore(ctx, "used") is None
+    assert artifacts.restore(ctx, "new")
+
+
+def test_fingerprinted_tasks_restore_outputs_built_by_another_checkout(tmp_path):
+    store = tmp_path / "store"
+    calls = []
+
+    @fingerprinted(inputs=["src/**/*.py"], outputs=["dist/*.txt"], name="tests.build", store=True)
+    def build(ctx):
+        calls.append(ctx.base_folder)
+        os.makedirs(os.path.join(ctx.base_folder, "dist"), exist_ok=True)
+        with open(os.path.join(ctx.base_folder, "dist", "out.txt"), "w") as f:
+            f.write("built")
+
+    first = _checkout(tmp_path / "first")
+    build(_context(first, store))
+    second = _checkout(tmp_path / "second")
+    build(_context(second, store))
+    assert len(calls) == 1
+    assert (second / "dist" / "out.txt").read_text() == "built"
+
+    (second / "src" / "module.py").write_text("x = 2\n")
+    build(_context(second, store))
+    build(_context(second, store), force=True)
+    assert len(calls) == 3
+
+
+def test_fingerprinted_tasks_remove_stale_outputs_when_restoring(tmp_path):
+    store = tmp_path / "store"
+    root = _checkout(tmp_path / "project")
+    ctx = _context(root, store)
+
+    @fingerprinted(inputs=["components/**/*"], outputs=["ghuser/*.ghuser"], name="tests.components", store=True)
+    def build_components(ctx):
+        os.makedirs(os.path.join(ctx.base_folder, "ghuser"), exist_ok=True)
+        for name in os.listdir(os.path.join(ctx.base_folder, "components")):
+            with open(os.path.join(ctx.base_folder, "ghuser", name + ".ghuser"), "w") as f:
+                f.write(name)
+
+    (root / "components" / "A").mkdir(parents=True)
+    (root / "components" / "A" / "code.py").write_text("a = 1\n")
+    build_components(ctx)
+
+    # e.g. a branch adding a component, then switching back
+    (root / "components" / "B").mkdir()
+    (root / "components" / "B" / "code.py").write_text("b = 1\n")
+    build_components(ctx)
+    assert sorted(os.listdir(str(root / "ghuser"))) == ["A.ghuser", "B.ghuser"]
+
+    (root / "components" / "B" / "code.py").unlink()
+    (root / "components" / "B").rmdir()
+    build_components(ctx)
+    assert os.listdir(str(root / "ghuser")) == ["A.ghuser"]
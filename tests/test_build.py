@@ -0,0 +1,252 @@
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+import invoke
+import pytest
+from invoke import Config
+from invoke import Context
+
+from compas_invocations2 import build
+from compas_invocations2.build import clean
+
+
+def _touch(path, content=b"x"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def _make_project(root):
+    _touch(os.path.join(root, "src", "pkg", "__init__.py"))
+    _touch(os.path.join(root, "src", "pkg", "__pycache__", "mod.cpython-311.pyc"), b"x" * 10)
+    _touch(os.path.join(root, "src", "pkg.egg-info", "PKG-INFO"))
+    _touch(os.path.join(root, "tests", "old.pyc"))
+    _touch(os.path.join(root, "dist", "pkg-1.0.tar.gz"), b"x" * 100)
+    _touch(os.path.join(root, "docs", "api", "generated", "pkg.rst"))
+    _touch(os.path.join(root, ".venv", "lib", "site.pyc"))
+    _touch(os.path.join(root, "data", "big", "keep.pyc"))
+
+
+def _context(root, **config):
+    return Context(config=Config(overrides=dict(base_folder=str(root), run={"in_stream": False}, **config)))
+
+
+def test_clean_dry_reports_without_deleting(tmp_path, capsys):
+    _make_project(str(tmp_path))
+
+    clean(_context(tmp_path), dry=True)
+
+    output = capsys.readouterr().out
+    assert "bytecode" in output
+    assert "builds" in output
+    assert os.path.exists(os.path.join(str(tmp_path), "dist", "pkg-1.0.tar.gz"))
+    assert os.path.exists(os.path.join(str(tmp_path), "src", "pkg", "__pycache__"))
+
+
+def test_clean_removes_artifacts_and_prunes_excluded(tmp_path):
+    root = str(tmp_path)
+    _make_project(root)
+
+    clean(_context(tmp_path, clean={"exclude": [".venv", "data/big"]}))
+
+    assert not os.path.exists(os.path.join(root, "src", "pkg", "__pycache__"))
+    assert not os.path.exists(os.path.join(root, "src", "pkg.egg-info"))
+    assert not os.path.exists(os.path.join(root, "tests", "old.pyc"))
+    assert not os.path.exists(os.path.join(root, "dist"))
+    assert not os.path.exists(os.path.join(root, "docs", "api", "generated"))
+    assert os.path.exists(os.path.join(root, "src", "pkg", "__init__.py"))
+    assert os.path.exists(os.path.join(root, ".venv", "lib", "site.pyc"))
+    assert os.path.exists(os.path.join(root, "data", "big", "keep.pyc"))
+
+
+def _git(*args, cwd=None):
+    cmd = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"] + list(args)
+    return subprocess.run(cmd, cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def _make_componentizer_remote(root):
+    work = os.path.join(root, "work")
+    remote = os.path.join(root, "remote.git")
+    _touch(os.path.join(work, "componentize_cpy.py"), b"print('v1')\n")
+    _git("init", "-q", work)
+    _git("add", "-A", cwd=work)
+    _git("commit", "-q", "-m", "v1", cwd=work)
+    _git("clone", "-q", "--bare", work, remote)
+    return work, remote
+
+
+def test_componentizer_cache_updates_and_falls_back_offline(tmp_path, monkeypatch):
+    monkeypatch.setattr(build, "_COMPONENTIZER_CHECKOUTS", {})
+    work, remote = _make_componentizer_remote(str(tmp_path))
+    ctx = _context(tmp_path, cache_dir=str(tmp_path / "cache"), componentizer={"repo_url": remote})
+
+    checkout = build._get_componentizer(ctx)
+    assert os.path.isfile(os.path.join(checkout, "componentize_cpy.py"))
+    # the second lookup within the same process does not touch git again
+    assert build._get_componentizer(ctx) == checkout
+
+    _touch(os.path.join(work, "componentize_cpy.py"), b"print('v2')\n")
+    _git("commit", "-q", "-am", "v2", cwd=work)
+    _git("push", "-q", remote, "HEAD", cwd=work)
+    monkeypatch.setattr(build, "_COMPONENTIZER_CHECKOUTS", {})
+    assert build._get_componentizer(ctx) == checkout
+    with open(os.path.join(checkout, "componentize_cpy.py")) as f:
+        assert "v2" in f.read()
+
+    shutil.rmtree(remote)
+    monkeypatch.setattr(build, "_COMPONENTIZER_CHECKOUTS", {})
+    assert build._get_componentizer(ctx) == checkout
+    assert os.path.isfile(os.path.join(checkout, "componentize_cpy.py"))
+
+
+def test_ghio_cache_reuses_verifies_and_evicts(tmp_path, monkeypatch):
+    downloads = []
+
+    def fake_fetch(target_folder):
+        downloads.append(target_folder)
+        _touch(os.path.join(target_folder, "GH_IO.dll"), "version {}".format(len(downloads)).encode())
+
+    monkeypatch.setattr(build, "_fetch_ghio_lib", fake_fetch)
+    ctx = _context(tmp_path, cache_dir=str(tmp_path / "cache"), ghio={"keep": 2})
+
+    first = build._get_ghio_folder(ctx)
+    assert build._get_ghio_folder(ctx) == first
+    assert len(downloads) == 1
+
+    # a corrupted cache entry is detected and downloaded again
+    _touch(os.path.join(first, "GH_IO.dll"), b"corrupted")
+    second = build._get_ghio_folder(ctx)
+    assert len(downloads) == 2
+    assert second != first
+
+    ctx.config.ghio.max_age = 0
+    third = build._get_ghio_folder(ctx)
+    fourth = build._get_ghio_folder(ctx)
+    assert len(downloads) == 4
+    assert os.path.isdir(third) and os.path.isdir(fourth)
+    assert not os.path.exists(second)
+
+
+def _fake_componentize(calls):
+    def componentize(source, target):
+        names = sorted(os.listdir(source))
+        calls.append(names)
+        for name in names:
+            with open(os.path.join(source, name, "code.py"), "rb") as f:
+                _touch(os.path.join(target, "Prefix_{}.ghuser".format(name)), f.read())
+
+    return componentize
+
+
+def test_build_components_only_rebuilds_changed(tmp_path):
+    source = str(tmp_path / "components")
+    target = str(tmp_path / "ghuser")
+    for name in ("Alpha", "Beta", "Gamma"):
+        _touch(os.path.join(source, name, "code.py"), name.encode())
+        _touch(os.path.join(source, name, "metadata.json"), b"{}")
+    calls = []
+
+    build._build_components(source, target, _fake_componentize(calls), ["cpython", None])
+    build._build_components(source, target, _fake_componentize(calls), ["cpython", None])
+    assert calls == [["Alpha", "Beta", "Gamma"]]
+
+    _touch(os.path.join(source, "Beta", "code.py"), b"changed")
+    shutil.rmtree(os.path.join(source, "Gamma"))
+    build._build_components(source, target, _fake_componentize(calls), ["cpython", None])
+    assert calls[-1] == ["Beta"]
+    outputs = sorted(f for f in os.listdir(target) if f.endswith(".ghuser"))
+    assert outputs == ["Prefix_Alpha.ghuser", "Prefix_Beta.ghuser"]
+
+    build._build_components(source, target, _fake_componentize(calls), ["cpython", None], force=True)
+    assert calls[-1] == ["Alpha", "Beta"]
+
+
+FAKE_COMPONENTIZER = """
+import os
+import sys
+import threading
+
+source, target = sys.argv[1:3]
+for name in sorted(os.listdir(source)):
+    if name == "Broken":
+        sys.exit("cannot componentize " + name)
+    with open(os.path.join(target, name + ".ghuser"), "w") as f:
+        f.write(name)
+"""
+
+
+def test_build_components_in_parallel_shards_reports_failures(tmp_path):
+    source = str(tmp_path / "components")
+    target = str(tmp_path / "ghuser")
+    script = str(tmp_path / "componentize_fake.py")
+    _touch(script, FAKE_COMPONENTIZER.encode())
+    for name in ("Alpha", "Beta", "Broken", "Delta", "Epsilon"):
+        _touch(os.path.join(source, name, "code.py"), name.encode())
+
+    def componentize(source, target):
+        subprocess.run([sys.executable, script, source, target], check=True, capture_output=True)
+
+    with pytest.raises(invoke.Exit):
+        build._build_components(source, target, componentize, ["cpython"], jobs=2)
+
+    outputs = sorted(f for f in os.listdir(target) if f.endswith(".ghuser"))
+    assert outputs == ["Alpha.ghuser", "Beta.ghuser", "Delta.ghuser", "Epsilon.ghuser"]
+    manifest = build.read_json(os.path.join(target, build.GHUSER_MANIFEST))
+    assert "Broken" not in manifest["components"]
+
+
+def test_build_ghuser_tasks_build_components_and_skip_up_to_date_builds(tmp_path, monkeypatch, capsys):
+    root = str(tmp_path / "project")
+    action_dir = str(tmp_path / "componentizer")
+    for script in ("componentize_ipy.py", "componentize_cpy.py"):
+        _touch(os.path.join(action_dir, script), FAKE_COMPONENTIZER.encode())
+    for name in ("Alpha", "Beta"):
+        _touch(os.path.join(root, "components", name, "code.py"), name.encode())
+    monkeypatch.setattr(build, "_get_componentizer", lambda ctx: action_dir)
+
+    folders = {"source_dir": os.path.join(root, "components"), "target_dir": os.path.join(root, "ghuser")}
+    ctx = _context(root, cache_dir=str(tmp_path / "cache"), ghuser=folders, ghuser_cpython=folders)
+    ghio = str(tmp_path / "ghio")
+
+    for task, kwargs in (
+        (build.build_ghuser_components, {"ironpython": sys.executable}),
+        (build.build_cpython_ghuser_components, {}),
+    ):
+        shutil.rmtree(folders["target_dir"], ignore_errors=True)
+        task(ctx, gh_io_folder=ghio, jobs=1, **kwargs)
+        outputs = sorted(f for f in os.listdir(folders["target_dir"]) if f.endswith(".ghuser"))
+        assert outputs == ["Alpha.ghuser", "Beta.ghuser"]
+
+        task(ctx, gh_io_folder=ghio, jobs=1, **kwargs)
+        assert "up to date" in capsys.readouterr().out
+
+
+def test_run_steps_runs_independent_steps_concurrently_and_stops_at_failure():
+    started = []
+    barrier = threading.Barrier(2, timeout=5)
+
+    def step(name, wait=False, fail=False):
+        def run():
+            started.append(name)
+            if wait:
+                barrier.wait()
+            if fail:
+                raise RuntimeError("boom")
+
+        return run
+
+    steps = {
+        "a": ([], step("a", wait=True)),
+        "b": ([], step("b", wait=True)),
+        "c": (["a", "b"], step("c", fail=True)),
+        "d": (["c"], step("d")),
+    }
+    assert build._plan_stages(steps) == [["a", "b"], ["c"], ["d"]]
+
+    with pytest.raises(invoke.Exit, match="`c` failed"):
+        build._run_steps(steps)
+    assert sorted(started[:2]) == ["a", "b"]
+    assert started[2:] == ["c"]
@@ -0,0 +1,101 @@
+import http.server
+import os
+import threading
+
+import pytest
+from invoke import Config
+from invoke import MockContext
+from invoke import Result
+
+from compas_invocations2 import docs
+from compas_invocations2.docs import _check_links
+from compas_invocations2.docs import _extract_links
+
+
+def _write(path, content, mtime):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+    os.utime(path, (mtime, mtime))
+
+
+def test_docs_rebuild_rereads_all_documents_without_touching_sources(tmp_path):
+    _write(str(tmp_path / "src/pkg/core.py"), "", 300)
+    _write(str(tmp_path / "docs/api/core.rst"), ".. automodule:: pkg.core\n", 100)
+    overrides = {"base_folder": str(tmp_path), "cache_dir": str(tmp_path / ".cache")}
+    ctx = MockContext(config=Config(overrides=overrides), run=Result(), repeat=True)
+
+    docs.docs(ctx)
+    docs.docs(ctx, rebuild=True)
+
+    commands = [call.args[0] for call in ctx.run.call_args_list]
+    assert len(commands) == 2
+    assert commands[0].startswith("sphinx-build") and " -E" not in commands[0]
+    assert commands[1].startswith("sphinx-build") and " -E" in commands[1]
+    assert os.path.getmtime(str(tmp_path / "docs/api/core.rst")) == 100
+
+
+def test_sphinx_linkcheck_ignore_reads_literal_patterns_and_warns_about_other_options(tmp_path):
+    conf = str(tmp_path / "conf.py")
+    _write(
+        conf,
+        "import os\nproject = 'pkg'\nlinkcheck_ignore = [r'https://a\\.org/', 'http://localhost']\n"
+        "linkcheck_anchors = False\n",
+        100,
+    )
+    messages = []
+
+    assert docs._sphinx_linkcheck_ignore(conf, messages.append) == [r"https://a\.org/", "http://localhost"]
+    assert len(messages) == 1 and "linkcheck_anchors" in messages[0]
+    assert docs._sphinx_linkcheck_ignore(str(tmp_path / "missing.py"), messages.append) == []
+
+
+@pytest.fixture
+def link_server():
+    requested = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            requested.append(self.path)
+            self.send_response(200 if self.path == "/ok" else 404)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(server.server_address[1]), requested
+    server.shutdown()
+
+
+def test_extract_links_strips_fragments(tmp_path):
+    _write(str(tmp_path / "index.html"), '<a href="https://a.org/x#y">x</a><img src="http://b.org/i.png">', 100)
+    _write(str(tmp_path / "api/mod.html"), '<a href="https://a.org/x">x</a><a href="#local">y</a>', 100)
+    _write(str(tmp_path / "_static/theme.html"), '<a href="https://c.org">x</a>', 100)
+
+    links = _extract_links(str(tmp_path))
+
+    assert links == {"https://a.org/x": {"index.html", "api/mod.html"}, "http://b.org/i.png": {"index.html"}}
+
+
+def test_check_links_uses_cached_results_until_they_expire(tmp_path, link_server):
+    url, requested = link_server
+    urls = [url + "/ok", url + "/missing"]
+    cache_path = str(tmp_path / "links.json")
+
+    results, hits = _check_links(urls, cache_path, ttl_ok=3600, ttl_broken=3600)
+    assert hits == 0
+    assert results[url + "/ok"][:2] == [True, 200]
+    assert results[url + "/missing"][:2] == [False, 404]
+
+    requested.clear()
+    results, hits = _check_links(urls, cache_path, ttl_ok=3600, ttl_broken=0)
+    assert hits == 1
+    assert requested == ["/missing"]
+
+    requested.clear()
+    results, hits = _check_links(urls, cache_path, ttl_ok=3600, ttl_broken=3600, refresh=True)
+    assert hits == 0
+    assert sorted(requested) == ["/missing", "/ok"]
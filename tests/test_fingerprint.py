@@ -0,0 +1,93 @@
+import os
+
+import pytest
+from invoke import Config
+from invoke import Context
+
+from compas_invocations2 import fingerprint
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.delenv("COMPAS_INVOCATIONS_FORCE", raising=False)
+    root = tmp_path / "project"
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "a.py").write_text("a = 1\n")
+    (root / "src" / "b.py").write_text("b = 2\n")
+    config = {"base_folder": str(root), "cache_dir": str(tmp_path / "cache"), "build": {"flavor": "fast"}}
+    return root, Context(config=Config(overrides=config))
+
+
+def test_fingerprinted_skips_tasks_until_inputs_settings_or_outputs_change(project, monkeypatch):
+    root, ctx = project
+    calls = []
+
+    @fingerprint.fingerprinted(inputs=["src/**/*.py"], outputs=["dist/*.txt"], config=["build.flavor"])
+    def build(ctx, name="out", jobs=1):
+        calls.append(name)
+        os.makedirs(os.path.join(ctx.base_folder, "dist"), exist_ok=True)
+        with open(os.path.join(ctx.base_folder, "dist", name + ".txt"), "w") as f:
+            f.write(name)
+
+    build(ctx)
+    build(ctx)
+    assert len(calls) == 1
+
+    # touching a file without changing it does not invalidate the fingerprint
+    os.utime(str(root / "src" / "a.py"), (1, 1))
+    build(ctx)
+    assert len(calls) == 1
+
+    (root / "src" / "a.py").write_text("a = 3\n")
+    build(ctx)
+    (root / "dist" / "out.txt").unlink()
+    build(ctx)
+    ctx.build.flavor = "slow"
+    build(ctx)
+    build(ctx, name="other")
+    assert len(calls) == 5
+
+    build(ctx, name="other", force=True)
+    monkeypatch.setenv("COMPAS_INVOCATIONS_FORCE", "1")
+    build(ctx, name="other")
+    assert len(calls) == 7
+
+    fingerprint.invalidate(ctx, build.__module__ + "." + build.__qualname__)
+    monkeypatch.delenv("COMPAS_INVOCATIONS_FORCE")
+    build(ctx, name="other")
+    assert len(calls) == 8
+
+
+def test_fingerprinted_honours_force_arguments_passed_positionally(project):
+    root, ctx = project
+    calls = []
+
+    @fingerprint.fingerprinted(inputs=["src/**/*.py"], outputs=["dist/*.txt"])
+    def build(ctx, force=False):
+        calls.append(force)
+        os.makedirs(os.path.join(ctx.base_folder, "dist"), exist_ok=True)
+        with open(os.path.join(ctx.base_folder, "dist", "out.txt"), "w") as f:
+            f.write("out")
+
+    build(ctx)
+    build(ctx, False)
+    build(ctx, True)
+    assert calls == [False, True]
+
+
+def test_files_digest_only_hashes_files_whose_stat_changed(project, monkeypatch):
+    root, ctx = project
+    paths = [str(root / "src" / "a.py"), str(root / "src" / "b.py")]
+    hashed = []
+    file_digest = fingerprint.file_digest
+    monkeypatch.setattr(fingerprint, "file_digest", lambda path: hashed.append(path) or file_digest(path))
+
+    digest = fingerprint.files_digest(ctx, paths, "1.0")
+    assert len(hashed) == 2
+    assert fingerprint.files_digest(ctx, paths, "1.0") == digest
+    assert len(hashed) == 2
+    assert fingerprint.files_digest(ctx, paths, "2.0") != digest
+
+    (root / "src" / "b.py").write_text("b = 3\n")
+    assert fingerprint.files_digest(ctx, paths, "1.0") != digest
+    assert hashed[2:] == [paths[1]]
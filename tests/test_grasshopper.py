@@ -0,0 +1,246 @@
+import functools
+import http.server
+import os
+import stat
+import sys
+import threading
+import zipfile
+
+import pytest
+from invoke import Config
+from invoke import Context
+from invoke import Exit
+
+from compas_invocations2 import grasshopper
+from compas_invocations2.cache import default_mode
+from compas_invocations2.cache import link_or_copy
+
+
+@pytest.fixture
+def yak_server(tmp_path):
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "yak.exe").write_bytes(b"MZ" * 1000)
+    requests_log = []
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def do_GET(self):
+            requests_log.append(self.headers.get("If-Modified-Since"))
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=str(served)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}/yak.exe".format(server.server_address[1]), requests_log, server
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_yak_executable_is_cached_and_revalidated(yak_server, tmp_path, monkeypatch):
+    url, requests_log, server = yak_server
+    monkeypatch.setenv("COMPAS_INVOCATIONS_CACHE", str(tmp_path / "cache"))
+    monkeypatch.setattr(grasshopper, "_YAK_EXECUTABLES", {})
+    monkeypatch.setattr(grasshopper, "YAK_RETRIES", 0)
+
+    path = grasshopper._download_yak_executable(url)
+    with open(path, "rb") as f:
+        assert f.read() == b"MZ" * 1000
+    assert grasshopper._download_yak_executable(url) == path
+    assert requests_log == [None]
+
+    # a new process revalidates with a conditional request instead of downloading again
+    monkeypatch.setattr(grasshopper, "_YAK_EXECUTABLES", {})
+    assert grasshopper._download_yak_executable(url) == path
+    assert len(requests_log) == 2 and requests_log[1] is not None
+
+    # and falls back to the cached copy when the server is unreachable
+    server.shutdown()
+    server.server_close()
+    monkeypatch.setattr(grasshopper, "_YAK_EXECUTABLES", {})
+    assert grasshopper._download_yak_executable(url) == path
+
+
+def test_update_header_skips_files_that_are_up_to_date(tmp_path):
+    code = tmp_path / "code.py"
+    code.write_text("# r: compas>=1.0\nprint('hello')\n")
+    mtime = code.stat().st_mtime_ns
+
+    assert grasshopper._update_header(code, ["# r: compas>=1.0\n"]) == (False, None)
+    assert code.stat().st_mtime_ns == mtime
+
+    assert grasshopper._update_header(code, ["# r: compas>=2.0\n", "# venv: site\n"]) == (True, None)
+    assert code.read_text() == "# r: compas>=2.0\n# venv: site\nprint('hello')\n"
+
+
+FAKE_YAK = """
+import os, re, sys
+with open(os.environ["FAKE_YAK_LOG"], "a") as f:
+    f.write(" ".join(sys.argv[1:]) + "\\n")
+version = re.search(r"version: (\\S+)", open("manifest.yml").read()).group(1)
+open("pkg-{}-any-any.yak".format(version), "wb").write(b"yak")
+"""
+
+
+@pytest.fixture
+def yak_project(tmp_path, monkeypatch):
+    root = tmp_path / "project"
+    (root / "ghuser").mkdir(parents=True)
+    (root / "ghuser" / "A.ghuser").write_bytes(b"a" * 100)
+    (root / "ghuser" / "B.ghuser").write_bytes(b"b" * 100)
+    (root / "manifest.yml").write_text("name: pkg\nversion: {{ version }}\n")
+    (root / "icon.png").write_bytes(b"png")
+    (root / "README.md").write_text("readme\n")
+    (root / "LICENSE").write_text("license\n")
+
+    script = tmp_path / "yak.py"
+    script.write_text(FAKE_YAK)
+    log = tmp_path / "yak.log"
+    monkeypatch.setenv("FAKE_YAK_LOG", str(log))
+    monkeypatch.setattr(grasshopper, "_get_yak_command", lambda ctx=None: [sys.executable, str(script)])
+
+    config = {
+        "base_folder": str(root),
+        "yak": {"manifest_path": "manifest.yml", "logo_path": "icon.png", "external": True},
+        "cache_dir": str(tmp_path / "cache"),
+        "ghuser": {"target_dir": "ghuser"},
+    }
+    return root, log, Context(config=Config(overrides=config))
+
+
+def test_yakerize_links_inputs_and_skips_unchanged_builds(yak_project):
+    root, log, ctx = yak_project
+    package = root / "dist" / "yak_package"
+
+    grasshopper.yakerize(ctx, version="1.0.0")
+    assert (package / "pkg-1.0.0-rh8-any.yak").is_file()
+    assert (package / "manifest.yml").read_text() == "name: pkg\nversion: 1.0.0\n"
+    assert (root / "manifest.yml").read_text() == "name: pkg\nversion: {{ version }}\n"
+    assert (package / "A.ghuser").read_bytes() == b"a" * 100
+    assert (package / "misc" / "LICENSE").is_file()
+
+    grasshopper.yakerize(ctx, version="1.0.0")
+    assert len(log.read_text().splitlines()) == 1
+
+    # other targets reuse the package that was already built
+    grasshopper.yakerize(ctx, version="1.0.0", target_rhino="rh7")
+    assert (package / "pkg-1.0.0-rh7-any.yak").is_file()
+    assert len(log.read_text().splitlines()) == 1
+
+    (root / "ghuser" / "B.ghuser").write_bytes(b"c" * 100)
+    grasshopper.yakerize(ctx, version="1.0.0", target_rhino="rh7")
+    grasshopper.yakerize(ctx, version="1.0.0", target_rhino="rh7", force=True)
+    assert len(log.read_text().splitlines()) == 3
+
+
+def test_yakerize_builds_once_for_several_targets(yak_project):
+    root, log, ctx = yak_project
+    package = root / "dist" / "yak_package"
+
+    grasshopper.yakerize(ctx, version="2.0.0", target_rhino="rh7, rh8_15")
+
+    assert len(log.read_text().splitlines()) == 1
+    assert sorted(f.name for f in package.glob("*.yak")) == ["pkg-2.0.0-rh7-any.yak", "pkg-2.0.0-rh8_15-any.yak"]
+    assert (package / "pkg-2.0.0-rh7-any.yak").read_bytes() == (package / "pkg-2.0.0-rh8_15-any.yak").read_bytes()
+
+    with pytest.raises(Exit):
+        grasshopper.yakerize(ctx, version="2.0.0", target_rhino="rh7,rh5")
+
+
+def test_link_or_copy_shares_data_with_the_source(tmp_path):
+    src = tmp_path / "src.bin"
+    src.write_bytes(b"data")
+    dst = tmp_path / "dst.bin"
+    dst.write_bytes(b"old")
+
+    method = link_or_copy(str(src), str(dst))
+
+    assert method in ("reflink", "hardlink", "copy")
+    assert dst.read_bytes() == b"data"
+    if method == "hardlink":
+        assert os.path.samefile(str(src), str(dst))
+
+
+def test_yakerize_packs_reproducible_packages_without_yak(yak_project, monkeypatch):
+    root, log, ctx = yak_project
+    ctx.yak.external = False
+    monkeypatch.setattr(grasshopper, "_get_yak_command", lambda ctx=None: pytest.fail("yak should not be used"))
+    package = root / "dist" / "yak_package" / "pkg-3.0.0-rh8-any.yak"
+
+    grasshopper.yakerize(ctx, version="3.0.0")
+    content = package.read_bytes()
+    grasshopper.yakerize(ctx, version="3.0.0", force=True)
+
+    assert package.read_bytes() == content
+    assert stat.S_IMODE(package.stat().st_mode) == default_mode()
+    with zipfile.ZipFile(str(package)) as archive:
+        assert archive.namelist() == [
+            "A.ghuser",
+            "B.ghuser",
+            "icon.png",
+            "manifest.yml",
+            "misc/LICENSE",
+            "misc/README.md",
+        ]
+        assert archive.read("manifest.yml") == b"name: pkg\nversion: 3.0.0\n"
+        assert {info.date_time for info in archive.infolist()} == {(1980, 1, 1, 0, 0, 0)}
+
+
+FAKE_YAK_PUSH = """
+import os, sys
+package = os.path.basename(sys.argv[-1])
+with open(os.environ["FAKE_YAK_LOG"], "a") as f:
+    f.write(package + "\\n")
+attempts = open(os.environ["FAKE_YAK_LOG"]).read().splitlines().count(package)
+if package.startswith("flaky") and attempts < 3:
+    sys.exit("503 Service Unavailable")
+if package.startswith("dup"):
+    sys.exit("409 Conflict: this package version already exists")
+"""
+
+
+def test_publish_yak_pushes_concurrently_and_retries_transient_failures(tmp_path, monkeypatch):
+    script = tmp_path / "yak.py"
+    script.write_text(FAKE_YAK_PUSH)
+    log = tmp_path / "yak.log"
+    monkeypatch.setenv("FAKE_YAK_LOG", str(log))
+    monkeypatch.setattr(grasshopper, "YAK_PUBLISH_BACKOFF", 0.01)
+    monkeypatch.setattr(grasshopper, "_get_yak_command", lambda ctx=None: pytest.fail("yak.command is set"))
+    for name in ("ok-rh7-any.yak", "ok-rh8-any.yak", "flaky-rh8-any.yak", "dup-rh8-any.yak"):
+        (tmp_path / name).write_bytes(b"yak")
+
+    config = {"base_folder": str(tmp_path), "yak": {"command": [sys.executable, str(script)]}}
+    ctx = Context(config=Config(overrides=config))
+
+    grasshopper.publish_yak(ctx, "{0}/ok-*.yak, {0}/flaky-rh8-any.yak".format(tmp_path), jobs=2)
+    assert sorted(log.read_text().splitlines()) == ["flaky-rh8-any.yak"] * 3 + ["ok-rh7-any.yak", "ok-rh8-any.yak"]
+
+    log.write_text("")
+    with pytest.raises(Exit):
+        grasshopper.publish_yak(ctx, str(tmp_path / "dup-rh8-any.yak"))
+    assert log.read_text().splitlines() == ["dup-rh8-any.yak"]
+
+    with pytest.raises(Exit):
+        grasshopper.publish_yak(ctx, str(tmp_path / "missing-*.yak"))
+
+
+def test_yakerize_restores_packages_from_the_artifact_store(yak_project, tmp_path):
+    root, log, ctx = yak_project
+    ctx.config.artifact_store = {"path": str(tmp_path / "store")}
+    package = root / "dist" / "yak_package"
+
+    grasshopper.yakerize(ctx, version="4.0.0")
+    content = (package / "pkg-4.0.0-rh8-any.yak").read_bytes()
+
+    # a fresh checkout of the same sources
+    (root / "dist" / grasshopper.YAK_FINGERPRINT).unlink()
+    for f in package.iterdir():
+        if f.is_file():
+            f.unlink()
+    grasshopper.yakerize(ctx, version="4.0.0", target_rhino="rh7,rh8")
+
+    assert len(log.read_text().splitlines()) == 1
+    assert (package / "pkg-4.0.0-rh7-any.yak").read_bytes() == content
+    assert (package / "pkg-4.0.0-rh8-any.yak").read_bytes() == content
@@ -0,0 +1,107 @@
+import json
+import os
+import subprocess
+
+from invoke import Config
+from invoke import Context
+from invoke import MockContext
+from invoke import Result
+
+from compas_invocations2.mkdocs import _select_versions
+from compas_invocations2.mkdocs import docs
+from compas_invocations2.mkdocs import prune_docs
+
+VERSIONS = [
+    {"version": "2.0.0", "title": "2.0.0", "aliases": ["latest"]},
+    {"version": "1.2.0", "title": "1.2.0", "aliases": []},
+    {"version": "1.2.0-rc.1", "title": "1.2.0-rc.1", "aliases": []},
+    {"version": "1.1.1", "title": "1.1.1", "aliases": []},
+    {"version": "1.1.0", "title": "1.1.0", "aliases": []},
+    {"version": "1.0.0", "title": "1.0.0", "aliases": ["stable"]},
+    {"version": "1.0.1-beta", "title": "1.0.1-beta", "aliases": []},
+    {"version": "dev", "title": "dev", "aliases": []},
+]
+
+
+def _git(root, *args):
+    cmd = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"] + list(args)
+    return subprocess.run(cmd, cwd=root, check=True, capture_output=True, text=True).stdout
+
+
+def test_select_versions_keeps_latest_patches_and_aliased_versions():
+    to_keep, to_delete = _select_versions(VERSIONS)
+    assert to_keep == ["1.0.0", "1.0.1-beta", "1.1.1", "1.2.0", "2.0.0", "dev"]
+    assert to_delete == ["1.1.0", "1.2.0-rc.1"]
+
+    to_keep, to_delete = _select_versions(VERSIONS, keep_minors=2, drop_prereleases=True)
+    assert to_keep == ["1.0.0", "1.2.0", "2.0.0", "dev"]
+    assert to_delete == ["1.0.1-beta", "1.1.0", "1.1.1", "1.2.0-rc.1"]
+
+
+def test_prune_docs_removes_versions_in_one_commit_without_checkout(tmp_path, monkeypatch):
+    for var in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(var, "test")
+    for var in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(var, "test@example.com")
+
+    root = str(tmp_path)
+    _git(root, "init", "-q", "-b", "main")
+    (tmp_path / "README.md").write_text("readme\n")
+    _git(root, "add", "README.md")
+    _git(root, "commit", "-q", "-m", "initial")
+
+    _git(root, "checkout", "-q", "--orphan", "gh-pages")
+    _git(root, "rm", "-q", "-rf", "--cached", ".")
+    for name in [v["version"] for v in VERSIONS] + ["latest", "stable"]:
+        os.makedirs(os.path.join(root, name, "assets"))
+        with open(os.path.join(root, name, "assets", "index.html"), "w") as f:
+            f.write(name)
+    (tmp_path / "versions.json").write_text(json.dumps(VERSIONS))
+    _git(root, "add", "-A", ".", ":!README.md")
+    _git(root, "commit", "-q", "-m", "deploy")
+    _git(root, "checkout", "-q", "-f", "main")
+    before = _git(root, "rev-parse", "gh-pages").strip()
+
+    ctx = Context(config=Config(overrides={"base_folder": root, "run": {"in_stream": False}}))
+    prune_docs(ctx, push=False, keep_minors="2")
+
+    assert _git(root, "rev-parse", "gh-pages^").strip() == before
+    assert _git(root, "rev-parse", "--abbrev-ref", "HEAD").strip() == "main"
+    assert _git(root, "ls-tree", "--name-only", "gh-pages").split() == [
+        "1.0.0",
+        "1.2.0",
+        "2.0.0",
+        "dev",
+        "latest",
+        "stable",
+        "versions.json",
+    ]
+    versions = json.loads(_git(root, "show", "gh-pages:versions.json"))
+    assert [v["version"] for v in versions] == ["2.0.0", "1.2.0", "1.0.0", "dev"]
+    assert _git(root, "show", "gh-pages:1.2.0/assets/index.html") == "1.2.0"
+
+
+def test_docs_is_skipped_until_an_input_changes(tmp_path):
+    (tmp_path / "mkdocs.yml").write_text("site_name: test\n")
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "index.md").write_text("# Hello\n")
+    (tmp_path / "dist" / "docs").mkdir(parents=True)
+    (tmp_path / "dist" / "docs" / "index.html").write_text("<html></html>")
+
+    config = {"base_folder": str(tmp_path), "cache_dir": str(tmp_path / "cache")}
+    ctx = MockContext(config=Config(overrides=config), run=Result(), repeat=True)
+
+    docs(ctx)
+    docs(ctx)
+    assert ctx.run.call_count == 1
+
+    (tmp_path / "docs" / "index.md").write_text("# Hello, world\n")
+    docs(ctx)
+    assert ctx.run.call_count == 2
+
+    (tmp_path / "docs" / "index.md").write_text("# Hello, dirty world\n")
+    docs(ctx, dirty=True)
+    docs(ctx)
+    docs(ctx, clean=True)
+    assert ctx.run.call_count == 5
+    assert "--dirty" in ctx.run.call_args_list[2][0][0]
@@ -0,0 +1,42 @@
+import os
+
+import invoke
+import pytest
+
+from compas_invocations2.project import load_project
+
+PYPROJECT = """
+[project]
+name = "my_package"
+dynamic = ["dependencies"]
+
+[tool.setuptools.dynamic]
+dependencies = {{ file = "requirements.txt" }}
+
+[tool.bumpversion]
+current_version = "{version}"
+"""
+
+
+def _write_project(folder, version):
+    with open(os.path.join(folder, "pyproject.toml"), "w") as f:
+        f.write(PYPROJECT.format(version=version))
+
+
+def test_load_project_is_cached_until_the_file_changes(tmp_path):
+    _write_project(str(tmp_path), "1.0.0")
+    (tmp_path / "requirements.txt").write_text("# comment\ncompas >=2.0, <3\n\nrequests\n")
+
+    project = load_project(str(tmp_path))
+    assert project.name == "my_package"
+    assert project.version == "1.0.0"
+    assert project.dependencies == ["compas >=2.0, <3", "requests"]
+    assert load_project(str(tmp_path)) is project
+
+    _write_project(str(tmp_path), "1.10.0")
+    assert load_project(str(tmp_path)).version == "1.10.0"
+
+
+def test_load_project_without_pyproject(tmp_path):
+    with pytest.raises(invoke.Exit):
+        load_project(str(tmp_path))
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Import time budget (in seconds) of a single task module, on top of `invoke` itself.
+IMPORT_BUDGET = float(os.environ.get("COMPAS_INVOCATIONS_IMPORT_BUDGET", "0.25"))
+
+# Third-party modules that must only be imported by the task bodies that need them.
+HEAVY_MODULES = ["requests", "semver", "urllib3"]
+
+MODULES = [
+    "compas_invocations2.build",
+    "compas_invocations2.docs",
+    "compas_invocations2.grasshopper",
+    "compas_invocations2.mkdocs",
+    "compas_invocations2.style",
+    "compas_invocations2.tests",
+]
+
+SCRIPT = """
+import sys
+import time
+
+import invoke
+
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+
+print(elapsed)
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def _measure_import(module):
+    script = SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    # best of a few runs, to not fail on a single hiccup of a busy machine
+    results = []
+    for _ in range(3):
+        output = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout
+        elapsed, loaded = output.splitlines()
+        results.append((float(elapsed), loaded))
+    return min(results)
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_task_module_import_time(module):
+    elapsed, loaded = _measure_import(module)
+
+    assert not loaded, "{} eagerly imports {}".format(module, loaded)
+    assert elapsed < IMPORT_BUDGET, "importing {} took {:.3f}s".format(module, elapsed)
@@ -0,0 +1,139 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from invoke import Config
+from invoke import Context
+from invoke import Exit
+from invoke import MockContext
+from invoke import Result
+
+from compas_invocations2 import style
+from compas_invocations2.console import chdir
+
+
+def _git(root, *args):
+    cmd = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"] + list(args)
+    subprocess.run(cmd, cwd=root, check=True, capture_output=True)
+
+
+def _write(root, path, content):
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_lint_and_format_run_ruff_on_the_configured_folders(tmp_path):
+    overrides = {"base_folder": str(tmp_path), "lint_folders": ["src", "docs"], "format_folders": ["src"]}
+    ctx = MockContext(config=Config(overrides=overrides), run=Result(), repeat=True)
+
+    style.lint(ctx)
+    style.format(ctx)
+
+    assert [call.args[0] for call in ctx.run.call_args_list] == [
+        'ruff check --fix "src" "docs"',
+        'ruff format "src"',
+    ]
+
+
+def test_lint_and_format_changed_only_run_ruff_on_changed_python_files(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    for path in ("src/pkg/a.py", "src/pkg/b.py", "tests/test_a.py", "scripts/run.py"):
+        _write(root, path, "x = 1\n")
+    _git(root, "init", "-q")
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", "initial")
+
+    _write(root, "src/pkg/a.py", "x = 2\n")
+    _write(root, "src/pkg/new.py", "y = 1\n")
+    _write(root, "src/pkg/data.json", "{}\n")
+    _write(root, "scripts/run.py", "x = 2\n")
+    os.remove(os.path.join(root, "src/pkg/b.py"))
+
+    # run git for real, but only record the ruff commands
+    commands = []
+    run = Context.run
+
+    def fake_run(self, command, **kwargs):
+        if command.startswith("ruff"):
+            commands.append(command)
+            return Result(command=command)
+        return run(self, command, **kwargs)
+
+    monkeypatch.setattr(Context, "run", fake_run)
+    ctx = Context(config=Config(overrides={"base_folder": root, "run": {"in_stream": False}}))
+
+    style.lint(ctx, changed=True)
+    style.format(ctx, changed="HEAD")
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", "changes")
+    style.lint(ctx, changed=True)
+
+    assert commands == [
+        'ruff check --fix "src/pkg/a.py" "src/pkg/new.py"',
+        'ruff format "src/pkg/a.py" "src/pkg/new.py"',
+    ]
+
+
+def test_lint_changed_matches_the_current_folder_and_single_files(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    for path in ("src/pkg/a.py", "tasks.py", "setup.py"):
+        _write(root, path, "x = 1\n")
+    _git(root, "init", "-q")
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", "initial")
+    for path in ("src/pkg/a.py", "tasks.py", "setup.py"):
+        _write(root, path, "x = 2\n")
+
+    ctx = Context(config=Config(overrides={"base_folder": root, "run": {"in_stream": False}}))
+    with chdir(root):
+        assert style._ruff_targets(ctx, ["."], True) == ["setup.py", "src/pkg/a.py", "tasks.py"]
+        assert style._ruff_targets(ctx, ["./src/", "tasks.py"], True) == ["src/pkg/a.py", "tasks.py"]
+
+
+def test_check_prints_results_in_configured_order_and_fails_if_any_checker_fails(tmp_path, capsys):
+    python = '"{}" -c'.format(sys.executable)
+    commands = {
+        # finishes last, but is printed first
+        "slow": python + " \"import time; time.sleep(0.5); print('slow output'); raise SystemExit(1)\"",
+        "fast": python + " \"print('fast output')\"",
+    }
+    overrides = {"base_folder": str(tmp_path), "check": {"commands": commands}, "run": {"in_stream": False}}
+    ctx = Context(config=Config(overrides=overrides))
+
+    with pytest.raises(Exit) as error:
+        style.check(ctx, checkers="slow,fast")
+    assert error.value.code == 1
+    assert "slow" in error.value.message and "fast" not in error.value.message
+
+    output = capsys.readouterr().out
+    assert (
+        output.index("❌ slow") < output.index("slow output") < output.index("✅ fast") < output.index("fast output")
+    )
+
+    style.check(ctx, checkers="fast")
+    assert "All checks passed!" in capsys.readouterr().out
+
+
+def test_check_rejects_unknown_checkers(tmp_path):
+    ctx = MockContext(config=Config(overrides={"base_folder": str(tmp_path)}), run=Result(), repeat=True)
+
+    with pytest.raises(Exit):
+        style.check(ctx, checkers="lint,typo")
+    assert ctx.run.call_count == 0
+
+
+def test_check_docs_links_uses_the_project_settings(tmp_path, capsys):
+    _write(str(tmp_path), "dist/docs/index.html", '<a href="https://example.invalid/page">page</a>')
+    overrides = {
+        "base_folder": str(tmp_path),
+        "cache_dir": str(tmp_path / "cache"),
+        "linkcheck": {"ignore": [r"https://example\.invalid/"]},
+    }
+
+    style.check(Context(config=Config(overrides=overrides)), checkers="docs-links")
+
+    assert "Checked 0 links" in capsys.readouterr().out
+    assert os.path.isdir(str(tmp_path / "cache" / "linkcheck"))
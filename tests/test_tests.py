@@ -0,0 +1,132 @@
+import os
+import subprocess
+
+from invoke import Config
+from invoke import Context
+
+from compas_invocations2 import tests
+from compas_invocations2.console import chdir
+
+FILES = {
+    "src/pkg/__init__.py": "",
+    "src/pkg/core.py": "X = 1\n",
+    "src/pkg/geometry.py": "from .core import X\n",
+    "src/pkg/io.py": "import json\n",
+    "tests/test_core.py": "from pkg import core\n",
+    "tests/test_geometry.py": "from pkg.geometry import X\n",
+    "tests/test_io.py": "import pkg.io\n",
+    "README.md": "readme\n",
+}
+
+
+def _write(root, files):
+    for path, content in files.items():
+        path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+
+def _git(root, *args):
+    cmd = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"] + list(args)
+    subprocess.run(cmd, cwd=root, check=True, capture_output=True)
+
+
+def _project(tmp_path):
+    root = str(tmp_path / "project")
+    _write(root, FILES)
+    _git(root, "init", "-q")
+    _git(root, "add", "-A")
+    _git(root, "commit", "-q", "-m", "initial")
+    config = {"base_folder": root, "cache_dir": str(tmp_path / "cache"), "run": {"in_stream": False}}
+    ctx = Context(config=Config(overrides=config))
+    return root, ctx
+
+
+def test_select_tests_follows_transitive_imports(tmp_path):
+    root, ctx = _project(tmp_path)
+
+    with chdir(root):
+        assert tests._select_tests(ctx, "HEAD") == []
+
+        _write(root, {"src/pkg/core.py": "X = 2\n", "README.md": "changed\n"})
+        assert tests._select_tests(ctx, "HEAD") == ["tests/test_core.py", "tests/test_geometry.py"]
+
+        _write(root, {"tests/test_new.py": "import pkg.io\n"})
+        selected = tests._select_tests(ctx, "HEAD")
+        assert selected == ["tests/test_core.py", "tests/test_geometry.py", "tests/test_new.py"]
+
+
+def test_select_tests_selects_importers_of_deleted_and_renamed_modules(tmp_path):
+    root, ctx = _project(tmp_path)
+
+    with chdir(root):
+        # populate the import graph cache
+        assert tests._select_tests(ctx, "HEAD") == []
+
+        os.remove(os.path.join(root, "src/pkg/core.py"))
+        assert tests._select_tests(ctx, "HEAD") == ["tests/test_core.py", "tests/test_geometry.py"]
+
+        _git(root, "checkout", "--", "src/pkg/core.py")
+        _git(root, "mv", "src/pkg/io.py", "src/pkg/files.py")
+        assert tests._select_tests(ctx, "HEAD") == ["tests/test_io.py"]
+
+
+def test_select_tests_runs_full_suite_when_config_changes(tmp_path):
+    root, ctx = _project(tmp_path)
+
+    with chdir(root):
+        _write(root, {"tests/conftest.py": "import pytest\n"})
+        assert tests._select_tests(ctx, "HEAD") is None
+
+
+def test_shard_files_balances_recorded_durations():
+    files = ["tests/test_a.py", "tests/test_b.py", "tests/test_c.py", "tests/test_d.py", "tests/test_new.py"]
+    history = {
+        "tests/test_a.py::test_slow": [10.0, 1],
+        "tests/test_b.py::test_one": [4.0, 1],
+        "tests/test_b.py::test_two": [3.0, 1],
+        "tests/test_c.py::test_fast": [2.0, 1],
+        "tests/test_d.py::test_fast": [1.0, 1],
+    }
+
+    shards = [tests._shard_files(files, history, i, 2) for i in range(2)]
+
+    assert shards == [
+        ["tests/test_a.py", "tests/test_new.py"],
+        ["tests/test_b.py", "tests/test_c.py", "tests/test_d.py"],
+    ]
+
+
+def test_test_records_durations_without_overriding_the_junit_report(tmp_path):
+    root = str(tmp_path / "project")
+    _write(
+        root,
+        {
+            "pytest.ini": "[pytest]\naddopts = --junitxml=report.xml\n",
+            "tests/test_a.py": "def test_one():\n    pass\n\n\n"
+            "class TestGroup:\n    def test_two(self):\n        pass\n",
+        },
+    )
+    overrides = {"base_folder": root, "cache_dir": str(tmp_path / "cache"), "run": {"in_stream": False, "hide": True}}
+    ctx = Context(config=Config(overrides=overrides))
+
+    tests.test(ctx)
+
+    assert os.path.exists(os.path.join(root, "report.xml"))
+    history = tests.read_json(tests._durations_path(ctx))
+    assert sorted(history) == ["tests/test_a.py::TestGroup::test_two", "tests/test_a.py::test_one"]
+
+
+def test_merge_durations_keeps_most_recent_measurement():
+    local = {"tests/test_a.py::test": [1.0, 100], "tests/test_b.py::test": [2.0, 100]}
+    job1 = {"tests/test_a.py::test": [1.5, 200]}
+    job2 = {"tests/test_b.py::test": [2.5, 50], "tests/test_c.py::test": [3.0, 200]}
+
+    merged = tests._merge_durations([local, job1, job2])
+
+    assert merged == {
+        "tests/test_a.py::test": [1.5, 200],
+        "tests/test_b.py::test": [2.0, 100],
+        "tests/test_c.py::test": [3.0, 200],
+    }
@@ -0,0 +1,66 @@
+import concurrent.futures
+import json
+import subprocess
+import sys
+import time
+
+import invoke
+from invoke import Config
+from invoke import Context
+
+from compas_invocations2 import timing
+
+
+@invoke.task
+def outer(ctx):
+    inner(ctx)
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+
+
+@invoke.task
+def inner(ctx):
+    ctx.run("echo hello", hide=True, in_stream=False)
+
+
+def test_timing_records_nested_tasks_and_commands(tmp_path, monkeypatch):
+    monkeypatch.setattr(timing, "_EVENTS", [])
+    timing.install(summary=False)
+    try:
+        outer(Context(config=Config()))
+    finally:
+        timing.uninstall()
+
+    recorded = [(e["category"], e["name"], e["depth"]) for e in timing.events()]
+    assert recorded == [
+        ("task", "outer", 0),
+        ("task", "inner", 1),
+        ("run", "echo hello", 2),
+        ("subprocess", "{} -c pass".format(sys.executable), 1),
+    ]
+
+    trace_path = str(tmp_path / "trace.json")
+    timing.write_trace(trace_path)
+    with open(trace_path) as f:
+        trace = json.load(f)
+    assert [e["name"] for e in trace["traceEvents"]] == [name for _, name, _ in recorded]
+    assert all(e["ph"] == "X" for e in trace["traceEvents"])
+
+
+def test_timing_total_does_not_count_worker_threads_twice(capsys, monkeypatch):
+    monkeypatch.setattr(timing, "_EVENTS", [])
+
+    def work():
+        with timing.span("worker", "run"):
+            time.sleep(0.1)
+
+    with timing.span("release"):
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            list(executor.map(lambda _: work(), range(2)))
+
+    release = timing.events()[0]
+    assert release["name"] == "release"
+    assert [e["depth"] for e in timing.events()] == [0, 0, 0]
+
+    timing.print_summary()
+    total = capsys.readouterr().out.splitlines()[-1].split()
+    assert total == ["Total", "{:.3f}".format(release["duration"])]